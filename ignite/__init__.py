@@ -1,13 +1,33 @@
 #!/usr/bin/env python3
 
 from ignite.binary import *
+from ignite.bloom import *
+from ignite.configuration import *
+from ignite.hotkeys import *
+from ignite.largeobject import *
+from ignite.limiter import *
+from ignite.singleflight import *
 from ignite.thinclient import *
 
 __all__ = [
+    'AIMDLimiter',
+    'BinaryCodec',
     'BinaryException',
     'BinaryObject',
+    'CacheConfiguration',
+    'CacheConfigurationException',
+    'ComplexObject',
+    'CountMinSketch',
+    'HotKeyTracker',
+    'KeyFilters',
+    'LargeObjectException',
+    'LargeObjectStore',
+    'SingleFlight',
     'ThinClient',
-    'ThinClientException'
+    'ThinClientException',
     'ThinClientPool',
-    'ThinClientPoolException'
+    'ThinClientPoolException',
+    'ThinClientPoolOverloadException',
+    'ThinClientTimeoutException',
+    'TypedCache'
 ]
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+from argparse import ArgumentParser
+from ignite.configuration import CacheConfiguration
+from ignite.mockserver import MockServer
+from ignite.thinclient import ThinClient, ThinClientPool
+from random import Random
+from threading import Thread
+from time import perf_counter
+
+
+# Shares of operations in YCSB-like workloads
+workloads = {
+    'read-heavy': {'get': 0.95, 'put': 0.05},
+    'update-heavy': {'get': 0.5, 'put': 0.5},
+    'write-heavy': {'get': 0.05, 'put': 0.95},
+    'read-only': {'get': 1.0},
+    'batch': {'get_all': 0.5, 'put_all': 0.5},
+    'scan': {'scan': 0.95, 'put': 0.05},
+}
+
+
+class UniformGenerator:
+
+    def __init__(self, items, random):
+        self.items = items
+        self.random = random
+
+    def next(self):
+        return self.random.randrange(self.items)
+
+
+class ZipfianGenerator:
+    """
+    Zipfian distribution of YCSB (Gray et al., Quickly Generating Billion-Record Synthetic Databases),
+    the ranks are scrambled so the hot keys are spread over the key space.
+    """
+
+    def __init__(self, items, random, theta=0.99):
+        self.items = items
+        self.random = random
+        self.theta = theta
+        zeta_2 = 1 + 0.5 ** theta
+        self.zeta_n = sum(1 / (i ** theta) for i in range(1, items + 1))
+        self.alpha = 1 / (1 - theta)
+        # With one or two items the first two ranks cover all the draws and eta is not used
+        self.eta = 0
+        if items > 2:
+            self.eta = (1 - (2 / items) ** (1 - theta)) / (1 - zeta_2 / self.zeta_n)
+        self.half_pow_theta = 1 + 0.5 ** theta
+
+    def next(self):
+        u = self.random.random()
+        uz = u * self.zeta_n
+        if uz < 1:
+            rank = 0
+        elif uz < self.half_pow_theta:
+            rank = 1
+        else:
+            rank = int(self.items * ((self.eta * u - self.eta + 1) ** self.alpha))
+        return (min(rank, self.items - 1) * 2654435761) % self.items
+
+
+class BenchWorker:
+
+    def __init__(self, options, operations, seed, pool=None):
+        self.options = options
+        self.operations = operations
+        self.random = Random(seed)
+        self.pool = pool
+        self.thin = None
+        if options.distribution == 'zipfian':
+            self.keys = ZipfianGenerator(options.keys, self.random)
+        else:
+            self.keys = UniformGenerator(options.keys, self.random)
+        self.value = b'\x00' * options.value_size
+        self.mix = list(workloads[options.workload].items())
+        self.latencies = {}
+        self.errors = 0
+
+    def call(self, method_name, *args, **kwargs):
+        if self.pool is not None:
+            return self.pool.submit(method_name, *args, **kwargs).result()
+        return getattr(self.thin, method_name)(*args, **kwargs)
+
+    def next_operation(self):
+        u = self.random.random()
+        for operation, share in self.mix:
+            if u < share:
+                return operation
+            u -= share
+        return self.mix[-1][0]
+
+    def execute(self, operation):
+        cache = self.options.cache
+        if operation == 'get':
+            self.call('cache_get', cache, self.keys.next())
+        elif operation == 'put':
+            self.call('cache_put', cache, self.keys.next(), self.value)
+        elif operation == 'get_all':
+            self.call('cache_get_all', cache, [self.keys.next() for idx in range(0, self.options.batch)])
+        elif operation == 'put_all':
+            self.call('cache_put_all', cache, {self.keys.next(): self.value for idx in range(0, self.options.batch)})
+        elif operation == 'scan':
+            self.call('scan_query', cache, partition=self.random.randrange(self.options.partitions),
+                      cursor_page_size=self.options.batch)
+
+    def run(self):
+        if self.pool is None:
+            self.thin = ThinClient()
+            self.thin.connect(self.options.address)
+        deadline = perf_counter() + self.options.duration
+        for idx in range(0, self.operations):
+            operation = self.next_operation()
+            start = perf_counter()
+            try:
+                self.execute(operation)
+            except Exception:
+                self.errors += 1
+                continue
+            end = perf_counter()
+            self.latencies.setdefault(operation, []).append(end - start)
+            if end > deadline:
+                break
+        if self.thin is not None:
+            self.thin.disconnect()
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+def load(options):
+    thin = ThinClient()
+    thin.connect(options.address)
+    value = b'\x00' * options.value_size
+    for start in range(0, options.keys, 1000):
+        thin.cache_put_all(options.cache, {key: value for key in range(start, min(start + 1000, options.keys))})
+    thin.disconnect()
+
+
+def run(options):
+    pool = None
+    if options.client == 'pool':
+        pool = ThinClientPool(options.concurrency, options.address, adaptive=options.adaptive,
+                              queue_size=options.queue_size, shed=options.shed)
+    workers = []
+    for idx in range(0, options.concurrency):
+        operations = options.operations // options.concurrency
+        if idx < options.operations % options.concurrency:
+            operations += 1
+        workers.append(BenchWorker(options, operations, options.seed + idx, pool))
+    threads = [Thread(target=worker.run) for worker in workers]
+    start = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - start
+    if pool is not None:
+        pool.close()
+    report = {'elapsed': elapsed, 'errors': sum(worker.errors for worker in workers), 'operations': {}}
+    for worker in workers:
+        for operation, latencies in worker.latencies.items():
+            report['operations'].setdefault(operation, []).extend(latencies)
+    return report
+
+
+def print_report(options, report):
+    total = sum(len(latencies) for latencies in report['operations'].values())
+    print("workload=%s client=%s concurrency=%s distribution=%s value_size=%s"
+          % (options.workload, options.client, options.concurrency, options.distribution, options.value_size))
+    print("operations=%s errors=%s elapsed=%.3fs throughput=%.1f ops/s"
+          % (total, report['errors'], report['elapsed'], total / report['elapsed']))
+    print("%-10s %10s %10s %10s %10s %10s %10s %10s"
+          % ('operation', 'count', 'p50 ms', 'p95 ms', 'p99 ms', 'p99.9 ms', 'max ms', 'ops/s'))
+    for operation in sorted(report['operations'].keys()):
+        latencies = sorted(report['operations'][operation])
+        print("%-10s %10s %10.3f %10.3f %10.3f %10.3f %10.3f %10.1f" % (
+            operation, len(latencies),
+            1000 * percentile(latencies, 0.5), 1000 * percentile(latencies, 0.95),
+            1000 * percentile(latencies, 0.99), 1000 * percentile(latencies, 0.999),
+            1000 * latencies[-1], len(latencies) / report['elapsed']
+        ))
+
+
+def main(args=None):
+    parser = ArgumentParser(prog='python -m ignite.bench', description='Load generator for Apache Ignite thin client')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=10800)
+    parser.add_argument('--mock', action='store_true', help='Run against a local mock server')
+    parser.add_argument('--cache', default='bench')
+    parser.add_argument('--workload', choices=sorted(workloads.keys()), default='read-heavy')
+    parser.add_argument('--client', choices=['thin', 'pool'], default='thin')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--adaptive', action='store_true', help='Adaptive concurrency limit of the pool')
+    parser.add_argument('--queue-size', type=int, default=None, help='Maximal number of waiting pool operations')
+    parser.add_argument('--shed', action='store_true', help='Fail the pool operations when the queue is full')
+    parser.add_argument('--operations', type=int, default=100000)
+    parser.add_argument('--duration', type=float, default=60, help='Maximal duration, seconds')
+    parser.add_argument('--keys', type=int, default=10000)
+    parser.add_argument('--distribution', choices=['uniform', 'zipfian'], default='uniform')
+    parser.add_argument('--value-size', type=int, default=100)
+    parser.add_argument('--batch', type=int, default=100, help='Keys of get_all/put_all and scan page size')
+    parser.add_argument('--partitions', type=int, default=1024)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-load', action='store_true', help='Skip loading of the keys before the run')
+    options = parser.parse_args(args)
+    mock = None
+    if options.mock:
+        mock = MockServer(caches=[options.cache], partitions=options.partitions).start()
+        options.address = mock.address
+    else:
+        options.address = (options.host, options.port)
+        thin = ThinClient()
+        thin.connect(options.address)
+        thin.cache_get_or_create_with_configuration(CacheConfiguration(options.cache))
+        thin.disconnect()
+    try:
+        if not options.no_load:
+            load(options)
+        report = run(options)
+        print_report(options, report)
+    finally:
+        if mock is not None:
+            mock.stop()
+    return report
+
+
+if __name__ == '__main__':
+    main()
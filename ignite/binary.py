@@ -1,9 +1,16 @@
 #!/usr/bin/env python3
 
-from struct import pack, unpack
+from struct import pack, unpack, Struct, error as struct_error
 from uuid import UUID
 
 
+def java_string_hashcode(s):
+    h = 0
+    for c in s:
+        h = (31 * h + ord(c)) & 0xFFFFFFFF
+    return ((h + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
 class BinaryException(Exception):
     pass
 
@@ -25,10 +32,13 @@ class BinaryObject:
         'python.str':       {'code': 9, 'parsing': 'encode-decode'},
         'python.UUID':      {'code': 10, 'size': 16, 'parsing': 'bytes-property'},
         'python.bytes':     {'code': 12, 'parsing': 'as-is'},
+        'python.bytearray': {'code': 12, 'parsing': 'as-is'},
+        'python.memoryview': {'code': 12, 'parsing': 'as-is'},
         'python.list':      {'code': 23, 'add_item_code': True, 'type_id': True},
         'python.dict':      {'code': 25, 'add_item_code': True},
         'python.NoneType':  {'code': 101, 'size': 0},
         'python.class':     {'code': 103},
+        'python.ComplexObject': {'code': 103},
 
         # Binary object types (for implicit serialization and interoperability)
         'byte':     {'code': 1, 'size': 1, 'parsing': 'to_bytes-from_bytes'},
@@ -89,6 +99,8 @@ class BinaryObject:
         self.raw_bytes = None
         self.value = None
         self.preferred_type = None
+        # Byte arrays are returned as memoryview slices of the raw bytes instead of copies
+        self.zero_copy = kwargs.get('zero_copy', False)
         self.debug_data = {
             'type_code': None
         }
@@ -114,7 +126,8 @@ class BinaryObject:
                 self.debug_data['type_code'] = code
             type_name = self.type_by_code(code)
             if type_name == 'python.class':
-                raise BinaryException("Complex object (class) not supported yet, use dict")
+                value, pos = ComplexObject.deserialize(binary, pos - 1, zero_copy=self.zero_copy)
+                break
             if type_name is None:
                 raise BinaryException("Unknown type code %s in position %s, %s" % (code, pos, list(binary)))
             type_data = self.types[type_name]
@@ -140,7 +153,7 @@ class BinaryObject:
                                 size -= 1
                             else:
                                 break
-                    value = binary[pos:pos+size].decode()
+                    value = str(binary[pos:pos+size], 'utf-8')
                     pos += size
                 elif parsing == 'to_bytes-from_bytes':
                     from_bytes = type_data.get('from_bytes')
@@ -155,9 +168,12 @@ class BinaryObject:
                 elif parsing == 'as-is':
                     size = int.from_bytes(binary[pos:pos+4], byteorder='little')
                     pos += 4
-                    value = binary[pos:pos+size]
+                    value = memoryview(binary)[pos:pos+size]
+                    if not self.zero_copy:
+                        value = value.tobytes()
+                    pos += size
                 elif parsing == 'bytes-property':
-                    value = UUID(bytes=binary[pos:pos+size])
+                    value = UUID(bytes=bytes(binary[pos:pos+size]))
                     pos += size
                 completed = True
             else:
@@ -218,10 +234,33 @@ class BinaryObject:
         #print("read: %s" % value)
         return value
 
+    def deserialize_entries(self, entry_num, pos=0):
+        binary = self.raw_bytes
+        values = []
+        for idx in range(0, entry_num):
+            value, pos = self.deserialize_entry(binary, pos, is_single_type=True)
+            values.append(value)
+        return values
+
     def skip_entries(self, entry_num, pos):
         binary = self.raw_bytes
         for idx in range(0, entry_num):
-            value, pos = self.deserialize_entry(binary, pos)
+            pos = self.skip_entry(binary, pos)
+        return pos
+
+    def skip_entry(self, binary, pos):
+        # The entries of fixed size or with the length header are skipped without decoding
+        code = binary[pos]
+        type_name = self.type_by_code(code)
+        type_data = self.types.get(type_name, {})
+        if type_name == 'python.class':
+            return pos + int.from_bytes(binary[pos+12:pos+16], byteorder='little')
+        if type_name == 'python.NoneType' or type_data.get('size') is not None:
+            return pos + 1 + type_data.get('size', 0)
+        if type_data.get('parsing') == 'as-is' or \
+                (type_data.get('parsing') == 'encode-decode' and type_data.get('skip_length_header') is not True):
+            return pos + 5 + int.from_bytes(binary[pos+1:pos+5], byteorder='little')
+        value, pos = self.deserialize_entry(binary, pos, is_single_type=True)
         return pos
 
     def serialize_entry(self, value, binary, **kwargs):
@@ -234,9 +273,11 @@ class BinaryObject:
             type_name = 'python.NoneType'
         is_list_type = (type_name.startswith('array.') or type_name == 'python.list') and type_name != 'array.byte'
         is_dict_type = type_name == 'python.dict' or type_name == 'map'
-        if self.types.get(type_name) == 'python.class':
+        if type_name == 'python.class':
             raise BinaryException("Complex object (class) not supported yet, use dict")
-        if self.types.get(type_name) is not None:
+        if type_name == 'python.ComplexObject':
+            binary += value.serialize()
+        elif self.types.get(type_name) is not None:
             type_data = self.types[type_name]
             binary += type_data['code'].to_bytes(1, byteorder='little')
             if self.debug_data.get('type_codes') is None:
@@ -307,3 +348,193 @@ class BinaryObject:
 
     def debug(self, key):
         return self.debug_data.get(key)
+
+
+class ComplexObject:
+    """
+    Object of a Java class in the binary object format, for example a scan query filter.
+    The type and field ids are the hash codes of the lowercase names as Ignite maps them by default.
+    The decoded objects know the ids only, the names are not sent without the binary type metadata.
+    """
+
+    header = Struct('<BBHiiiii')
+
+    version = 1
+    flag_user_type = 0x0001
+    flag_has_schema = 0x0002
+    flag_offset_one_byte = 0x0008
+    flag_offset_two_bytes = 0x0010
+    flag_compact_footer = 0x0020
+
+    def __init__(self, class_name=None, fields=None, **kwargs):
+        """
+        :param      class_name: The full name of the Java class.
+                    fields:     The dictionary of the field names and values.
+                    kwargs:     types - the dictionary of binary types of the fields like 'int' for the values
+                                which python types are not the same as Java ones.
+                                type_id - the type id of the decoded objects.
+        """
+        self.class_name = class_name
+        self.type_id = kwargs.get('type_id')
+        if self.type_id is None:
+            self.type_id = self.name_id(class_name)
+        self.types = kwargs.get('types', {})
+        # Field values by field ids
+        self.fields = {}
+        self.field_types = {}
+        for name, value in (fields or {}).items():
+            self.fields[self.name_id(name)] = value
+            self.field_types[self.name_id(name)] = self.types.get(name)
+
+    @staticmethod
+    def name_id(name):
+        return java_string_hashcode(name.lower())
+
+    def field(self, name, default=None):
+        return self.fields.get(self.name_id(name), default)
+
+    def __eq__(self, other):
+        return isinstance(other, ComplexObject) and self.type_id == other.type_id and self.fields == other.fields
+
+    def __repr__(self):
+        return "ComplexObject(%s, %s)" % (self.class_name or self.type_id, self.fields)
+
+    @staticmethod
+    def schema_id(field_ids):
+        # FNV-1 hash of the field ids
+        schema_id = 0x811C9DC5
+        for field_id in field_ids:
+            for byte in field_id.to_bytes(4, byteorder='little', signed=True):
+                schema_id = ((schema_id ^ byte) * 0x01000193) & 0xFFFFFFFF
+        return ((schema_id + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+    def serialize(self):
+        data = b''
+        schema = b''
+        for field_id, value in self.fields.items():
+            schema += pack('<ii', field_id, self.header.size + len(data))
+            data += BinaryObject().serialize_entry(value, b'', type=self.field_types.get(field_id))
+        # Java Arrays.hashCode of the signed data bytes
+        hash_code = 1
+        for byte in data:
+            hash_code = (31 * hash_code + byte - ((byte & 0x80) << 1)) & 0xFFFFFFFF
+        hash_code = ((hash_code + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        flags = self.flag_user_type
+        schema_id = 0
+        if len(self.fields) > 0:
+            flags |= self.flag_has_schema
+            schema_id = self.schema_id(self.fields.keys())
+        return self.header.pack(
+            BinaryObject.types['python.ComplexObject']['code'], self.version, flags, self.type_id, hash_code,
+            self.header.size + len(data) + len(schema), schema_id, self.header.size + len(data)
+        ) + data + schema
+
+    @classmethod
+    def deserialize(cls, binary, pos, **kwargs):
+        code, version, flags, type_id, hash_code, length, schema_id, schema_offset = cls.header.unpack_from(binary, pos)
+        obj = cls(type_id=type_id)
+        end_pos = pos + length
+        if not flags & cls.flag_has_schema:
+            return obj, end_pos
+        if flags & cls.flag_compact_footer:
+            raise BinaryException("Complex object %s with compact footer requires binary type metadata" % type_id)
+        offset_size = 4
+        if flags & cls.flag_offset_one_byte:
+            offset_size = 1
+        elif flags & cls.flag_offset_two_bytes:
+            offset_size = 2
+        bin_obj = BinaryObject(zero_copy=kwargs.get('zero_copy', False))
+        schema_pos = pos + schema_offset
+        # Raw data offset may follow the schema
+        while schema_pos + 4 + offset_size <= end_pos:
+            field_id = int.from_bytes(binary[schema_pos:schema_pos+4], byteorder='little', signed=True)
+            field_offset = int.from_bytes(binary[schema_pos+4:schema_pos+4+offset_size], byteorder='little')
+            obj.fields[field_id], field_end = bin_obj.deserialize_entry(binary, pos + field_offset, is_single_type=True)
+            schema_pos += 4 + offset_size
+        return obj, end_pos
+
+
+class BinaryCodec:
+    """
+    Encoder and decoder bound to one binary type. The type is resolved once when the codec is created,
+    so the values are neither inspected for their python type nor looked up in the types table.
+    """
+
+    int_formats = {1: 'b', 2: 'h', 4: 'i', 8: 'q'}
+
+    header = Struct('<Bi')
+
+    def __init__(self, type_name, **kwargs):
+        type_data = BinaryObject.types.get(type_name)
+        if type_data is None or type_name in ['python.NoneType', 'python.class', 'python.ComplexObject']:
+            raise BinaryException("Unknown type %s" % type_name)
+        self.type_name = type_name
+        self.code = type_data['code']
+        self.zero_copy = kwargs.get('zero_copy', False)
+        self.value_struct = None
+        self.kind = 'generic'
+        parsing = type_data.get('parsing')
+        if parsing == 'to_bytes-from_bytes':
+            self.kind = 'struct'
+            if type_data.get('from_values') is not None:
+                self.kind = 'bool'
+                self.value_struct = Struct('<?')
+            else:
+                self.value_struct = Struct('<%s' % self.int_formats[type_data['size']])
+        elif parsing == 'pack-unpack':
+            self.kind = 'struct'
+            self.value_struct = Struct('<%s' % BinaryObject.pack_float_formats[type_data['size']])
+        elif parsing == 'encode-decode' and type_data.get('skip_length_header') is not True:
+            self.kind = 'string'
+        elif parsing == 'as-is':
+            self.kind = 'bytes'
+        elif parsing == 'bytes-property':
+            self.kind = 'uuid'
+        self.code_struct = None
+        if self.value_struct is not None:
+            self.code_struct = Struct('<B%s' % self.value_struct.format[1:])
+
+    def encode(self, value):
+        try:
+            if self.kind == 'struct':
+                return self.code_struct.pack(self.code, value)
+            elif self.kind == 'bool':
+                if not isinstance(value, bool):
+                    raise TypeError("bool expected")
+                return self.code_struct.pack(self.code, value)
+            elif self.kind == 'string':
+                encoded_bytes = value.encode()
+                return self.header.pack(self.code, len(encoded_bytes)) + encoded_bytes
+            elif self.kind == 'bytes':
+                # The length is of the bytes, not of the items of the typed buffers like array('q')
+                data = memoryview(value).cast('B')
+                return self.header.pack(self.code, data.nbytes) + data
+            elif self.kind == 'uuid':
+                return self.code.to_bytes(1, byteorder='little') + value.bytes
+            return BinaryObject().load_value(value).serialize(type=self.type_name)
+        except (AttributeError, TypeError, struct_error) as e:
+            raise BinaryException("Value %r is not of type %s: %s" % (value, self.type_name, e))
+
+    def decode(self, binary, pos):
+        code = binary[pos]
+        if code == BinaryObject.types['python.NoneType']['code']:
+            return None, pos + 1
+        if code != self.code:
+            raise BinaryException("Type %s (code %s) expected, found code %s in position %s"
+                                  % (self.type_name, self.code, code, pos))
+        pos += 1
+        if self.value_struct is not None:
+            value, = self.value_struct.unpack_from(binary, pos)
+            return value, pos + self.value_struct.size
+        elif self.kind in ['string', 'bytes']:
+            size = int.from_bytes(binary[pos:pos+4], byteorder='little')
+            pos += 4
+            value = memoryview(binary)[pos:pos+size]
+            if self.kind == 'string':
+                value = str(value, 'utf-8')
+            elif not self.zero_copy:
+                value = value.tobytes()
+            return value, pos + size
+        elif self.kind == 'uuid':
+            return UUID(bytes=bytes(binary[pos:pos+16])), pos + 16
+        return BinaryObject(zero_copy=self.zero_copy).deserialize_entry(binary, pos - 1, is_single_type=True)
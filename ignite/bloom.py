@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+from hashlib import blake2b
+from math import ceil, log
+from threading import Lock
+from time import time
+from uuid import UUID
+
+
+class BloomFilter:
+    """
+    Bloom filter of keys: a key which is not in the filter was never added, a key in the filter was added
+    with the probability of 1 - false_positive_rate while the number of keys is within the capacity.
+    Only the keys of the types which are decoded to equal values are filtered: bool, int, float, str and UUID.
+    """
+
+    filterable_types = (bool, int, float, str, UUID)
+
+    def __init__(self, capacity, false_positive_rate=0.01):
+        self.capacity = max(1, capacity)
+        self.false_positive_rate = false_positive_rate
+        self.size = int(ceil(-self.capacity * log(false_positive_rate) / log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / self.capacity * log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    @classmethod
+    def filterable(cls, key):
+        return type(key) in cls.filterable_types
+
+    def __positions(self, key):
+        # Double hashing: the positions are h1 + i * h2 of the typed key digest
+        digest = blake2b(('%s:%r' % (type(key).__name__, key)).encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], byteorder='little')
+        h2 = int.from_bytes(digest[8:], byteorder='little') | 1
+        return [(h1 + idx * h2) % self.size for idx in range(0, self.hashes)]
+
+    def add(self, key):
+        added = False
+        for pos in self.__positions(key):
+            if not self.bits[pos >> 3] & (1 << (pos & 7)):
+                self.bits[pos >> 3] |= 1 << (pos & 7)
+                added = True
+        # The keys added again are not counted, so the repeated writes do not fill the capacity
+        if added:
+            self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self.__positions(key))
+
+
+class KeyFilters:
+    """
+    Bloom filters of the cache keys built by the key scans and updated by the writes of the clients
+    sharing the filters. A key which is not in the filter of its cache is answered as missing without a request.
+    The keys written by other clients or by SQL are not known until the next rebuild, so the filter is rebuilt
+    every rebuild_interval seconds and when the number of keys exceeds its capacity.
+    """
+
+    def __init__(self):
+        self.filters = {}
+        self.options = {}
+        self.lock = Lock()
+
+    def enable(self, cache, **kwargs):
+        """
+        :param      cache:  The cache name.
+                    kwargs: false_positive_rate - 0.01 by default.
+                            rebuild_interval - seconds, 300 by default, None to rebuild on capacity overflow only.
+                            headroom - the capacity of the filter in the cache sizes, 2 by default.
+        """
+        with self.lock:
+            self.filters.pop(cache, None)
+            self.options[cache] = {
+                'false_positive_rate': kwargs.get('false_positive_rate', 0.01),
+                'rebuild_interval': kwargs.get('rebuild_interval', 300),
+                'headroom': kwargs.get('headroom', 2),
+                'built': None,
+                # The keys written while the filter is built, they are added to the new filter
+                'pending': None,
+                # Some keys were written while the filter is built but they are not known
+                'unknown': False,
+            }
+
+    def disable(self, cache):
+        with self.lock:
+            self.options.pop(cache, None)
+            self.filters.pop(cache, None)
+
+    def reset_after_fork(self):
+        # The builds are done by the threads of the parent process, they are not finished in the child one
+        self.lock = Lock()
+        for options in self.options.values():
+            if options['pending'] is not None:
+                options['pending'] = None
+                options['built'] = None
+
+    def __due(self, options, bloom):
+        if options['built'] is None:
+            return True
+        if bloom is None or bloom.count > bloom.capacity:
+            # Not more often than once a second if the builds fail or the keys are not known
+            return time() - options['built'] > 1
+        return options['rebuild_interval'] is not None and time() - options['built'] > options['rebuild_interval']
+
+    def due(self, cache):
+        """
+        :return:    True if the filter of the cache has to be rebuilt and it's not being rebuilt now.
+        """
+        options = self.options.get(cache)
+        if options is None or options['pending'] is not None:
+            return False
+        return self.__due(options, self.filters.get(cache))
+
+    def claim(self, cache, force=False):
+        """
+        Reserve the build of the filter of the cache, so only one client builds it.
+        :return:    The options of the filter to pass to build or None if the build is not due or in progress.
+        """
+        with self.lock:
+            options = self.options.get(cache)
+            if options is None or options['pending'] is not None:
+                return None
+            if not force and not self.__due(options, self.filters.get(cache)):
+                return None
+            options['pending'] = []
+            options['unknown'] = False
+            return options
+
+    def build(self, client, cache, options):
+        """
+        Build the claimed filter of the cache by the key scan of the whole cache with the client, the scan of
+        the partitions one by one would depend on their number which is not known to the client.
+        The filter in use answers the lookups until the new one is built.
+        """
+        try:
+            capacity = max(1024, int(client.cache_get_size(cache) * options['headroom']))
+            bloom = BloomFilter(capacity, options['false_positive_rate'])
+            for key in client.scan_query_keys(cache):
+                if BloomFilter.filterable(key):
+                    bloom.add(key)
+        except BaseException:
+            self.cancel(options)
+            raise
+        with self.lock:
+            pending = options['pending']
+            options['pending'] = None
+            options['built'] = time()
+            if options['unknown'] or self.options.get(cache) is not options:
+                # The filter misses the keys written meanwhile or it was disabled while it was built
+                return
+            for key in pending:
+                bloom.add(key)
+            self.filters[cache] = bloom
+
+    def cancel(self, options):
+        """
+        Release the claimed build which failed, it's repeated later.
+        """
+        with self.lock:
+            options['pending'] = None
+            options['built'] = time()
+
+    def present(self, cache, keys):
+        """
+        :return:    The list of keys which may be in the cache, the rest are surely not there.
+        """
+        bloom = self.filters.get(cache)
+        if bloom is None:
+            return keys
+        return [key for key in keys if not BloomFilter.filterable(key) or key in bloom]
+
+    def add(self, cache, keys):
+        """
+        Add the keys to be written, the filter of the cache is dropped if the keys are not known.
+        :param      keys:   The list of keys or None if the keys are not known, e.g. encoded by the caller.
+        """
+        options = self.options.get(cache)
+        if options is None:
+            return
+        with self.lock:
+            if keys is None:
+                self.filters.pop(cache, None)
+                options['unknown'] = True
+                return
+            bloom = self.filters.get(cache)
+            for key in keys:
+                if BloomFilter.filterable(key):
+                    if bloom is not None:
+                        bloom.add(key)
+                    if options['pending'] is not None:
+                        options['pending'].append(key)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+from array import array
+from struct import Struct
+from sys import byteorder
+from ignite.binary import BinaryObject
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+
+class Column:
+
+    # Array type codes for the primitive binary types
+    typecodes = {1: 'b', 2: 'h', 3: 'i', 4: 'q', 5: 'f', 6: 'd', 8: 'b'}
+    struct_formats = {1: '<b', 2: '<h', 3: '<i', 4: '<q', 5: '<f', 6: '<d', 8: '<?'}
+    dtypes = {1: 'int8', 2: 'int16', 3: 'int32', 4: 'int64', 5: 'float32', 6: 'float64', 8: 'bool'}
+    float_codes = [5, 6]
+
+    def __init__(self, rows, **kwargs):
+        # The column is 'new' until the first value, then 'typed' or 'object'
+        self.kind = 'new'
+        self.code = None
+        self.struct = None
+        self.values = [None] * rows
+        self.zero_copy = kwargs.get('zero_copy', False)
+
+    def __len__(self):
+        return len(self.values)
+
+    def to_objects(self):
+        if self.kind == 'typed':
+            values = self.values.tolist()
+            if self.code == 8:
+                values = [bool(value) for value in values]
+            self.values = values
+        self.kind = 'object'
+        self.code = None
+        self.struct = None
+
+    def append(self, binary, pos):
+        code = binary[pos]
+        if self.kind == 'typed' and code == self.code:
+            value, = self.struct.unpack_from(binary, pos + 1)
+            self.values.append(value)
+            return pos + 1 + self.struct.size
+        if self.kind == 'new' and code in self.typecodes and (len(self.values) == 0 or code in self.float_codes):
+            # The rows without values before the first one are NaN for float columns
+            self.kind = 'typed'
+            self.code = code
+            self.struct = Struct(self.struct_formats[code])
+            self.values = array(self.typecodes[code], [float('nan')] * len(self.values))
+            return self.append(binary, pos)
+        self.to_objects()
+        value, pos = BinaryObject(zero_copy=self.zero_copy).deserialize_entry(binary, pos, is_single_type=True)
+        self.values.append(value)
+        return pos
+
+    def append_missing(self):
+        if self.kind == 'typed' and self.code in self.float_codes:
+            self.values.append(float('nan'))
+        else:
+            if self.kind == 'typed':
+                self.to_objects()
+            self.values.append(None)
+
+    def to_numpy(self):
+        if self.kind == 'typed':
+            if len(self.values) == 0:
+                return numpy.array([], dtype=self.dtypes[self.code])
+            # The array buffer is shared, not copied
+            return numpy.frombuffer(self.values, dtype=self.dtypes[self.code])
+        values = numpy.empty(len(self.values), dtype=object)
+        values[:] = self.values
+        return values
+
+
+class ColumnarDecoder:
+    """
+    Decode scan pages of key-value pairs into columns. The fields of map values become separate columns,
+    the primitive fields are unpacked straight into typed arrays without creating python objects for them.
+    """
+
+    map_code = BinaryObject.types['map']['code']
+
+    def __init__(self, columns=None, **kwargs):
+        self.key_column = kwargs.get('key_column', '_key')
+        self.value_column = kwargs.get('value_column', '_value')
+        self.zero_copy = kwargs.get('zero_copy', False)
+        self.subset = None
+        self.columns = {}
+        self.rows = 0
+        if columns is not None:
+            self.subset = set(columns)
+            for name in columns:
+                self.columns[name] = Column(0, zero_copy=self.zero_copy)
+
+    def __column(self, name):
+        column = self.columns.get(name)
+        if column is None:
+            column = Column(self.rows, zero_copy=self.zero_copy)
+            self.columns[name] = column
+        return column
+
+    def __decode_field(self, name, binary, pos):
+        if self.subset is not None and name not in self.subset:
+            value, pos = BinaryObject().deserialize_entry(binary, pos, is_single_type=True)
+            return pos
+        return self.__column(name).append(binary, pos)
+
+    def decode_page(self, binary, count):
+        bin_obj = BinaryObject()
+        pos = 0
+        for item_idx in range(0, count, 2):
+            pos = self.__decode_field(self.key_column, binary, pos)
+            if binary[pos] == self.map_code:
+                item_cnt = int.from_bytes(binary[pos+1:pos+5], byteorder='little')
+                # skip type code, number of pairs and 1 byte where type of map is defined
+                pos += 6
+                for field_idx in range(0, item_cnt):
+                    name, pos = bin_obj.deserialize_entry(binary, pos, is_single_type=True)
+                    pos = self.__decode_field(name, binary, pos)
+            else:
+                pos = self.__decode_field(self.value_column, binary, pos)
+            self.rows += 1
+            for column in self.columns.values():
+                if len(column) < self.rows:
+                    column.append_missing()
+
+    def result(self, output='numpy'):
+        if output == 'array':
+            return {name: column.values for name, column in self.columns.items()}
+        if numpy is None:
+            raise ImportError("numpy is required for '%s' output" % output)
+        arrays = {name: column.to_numpy() for name, column in self.columns.items()}
+        if output == 'pandas':
+            if pandas is None:
+                raise ImportError("pandas is required for 'pandas' output")
+            return pandas.DataFrame(arrays)
+        return arrays
+
+
+class ColumnarException(Exception):
+    pass
+
+
+class ColumnarEncoder:
+    """
+    Encode the key and value columns of primitive types into the key-value pairs of put all requests.
+    The type codes and the little-endian values are interleaved by the copies of whole columns, the elements
+    do not become python objects. The columns are numpy arrays or, without numpy, python arrays.
+    """
+
+    # Binary type codes of the numpy dtype kinds and sizes
+    numpy_codes = {('i', 1): 1, ('i', 2): 2, ('i', 4): 3, ('i', 8): 4, ('f', 4): 5, ('f', 8): 6, ('b', 1): 8}
+    # Binary type codes of the python array type codes by the item sizes
+    array_codes = {
+        'b': {1: 1}, 'h': {2: 2}, 'i': {2: 2, 4: 3}, 'l': {4: 3, 8: 4}, 'q': {8: 4}, 'f': {4: 5}, 'd': {8: 6}
+    }
+
+    def __init__(self, keys, values):
+        self.keys, self.key_code = self.__column(keys)
+        self.values, self.value_code = self.__column(values)
+        if len(self.keys) != len(self.values):
+            raise ColumnarException("Numbers of keys %s and values %s differ" % (len(self.keys), len(self.values)))
+        self.rows = len(self.keys)
+        self.key_size = self.keys.itemsize
+        self.value_size = self.values.itemsize
+        self.row_size = 2 + self.key_size + self.value_size
+        if numpy is not None:
+            self.dtype = numpy.dtype([
+                ('key_code', 'u1'), ('key', self.keys.dtype), ('value_code', 'u1'), ('value', self.values.dtype)
+            ])
+
+    def __column(self, values):
+        if numpy is not None:
+            values = numpy.asarray(values)
+            code = self.numpy_codes.get((values.dtype.kind, values.dtype.itemsize))
+            if values.ndim != 1 or code is None:
+                raise ColumnarException("Column of %s dimensions of type %s is not supported"
+                                        % (values.ndim, values.dtype))
+            return values.astype(values.dtype.newbyteorder('<'), copy=False), code
+        if not isinstance(values, array):
+            raise ColumnarException("numpy is required for the columns of type %s" % type(values).__name__)
+        code = self.array_codes.get(values.typecode, {}).get(values.itemsize)
+        if code is None:
+            raise ColumnarException("Column of type code '%s' is not supported" % values.typecode)
+        if byteorder == 'big':
+            values = array(values.typecode, values)
+            values.byteswap()
+        return values, code
+
+    def __encode_numpy(self, start, stop):
+        pairs = numpy.empty(stop - start, dtype=self.dtype)
+        pairs['key_code'] = self.key_code
+        pairs['key'] = self.keys[start:stop]
+        pairs['value_code'] = self.value_code
+        pairs['value'] = self.values[start:stop]
+        return memoryview(pairs.view(numpy.uint8))
+
+    def __encode_array(self, start, stop):
+        rows = stop - start
+        pairs = bytearray(rows * self.row_size)
+        keys = self.keys[start:stop].tobytes()
+        values = self.values[start:stop].tobytes()
+        # Every byte of the items is copied to its place in all the rows by one strided copy
+        pairs[0::self.row_size] = bytes([self.key_code]) * rows
+        for idx in range(0, self.key_size):
+            pairs[1+idx::self.row_size] = keys[idx::self.key_size]
+        pairs[1+self.key_size::self.row_size] = bytes([self.value_code]) * rows
+        for idx in range(0, self.value_size):
+            pairs[2+self.key_size+idx::self.row_size] = values[idx::self.value_size]
+        return pairs
+
+    def pages(self, page_bytes):
+        """
+        Encode the pairs by pages of at most page_bytes bytes, one row at least.
+        :return:    The iterator of (binary, rows) tuples.
+        """
+        page_rows = max(1, page_bytes // self.row_size)
+        for start in range(0, self.rows, page_rows):
+            stop = min(start + page_rows, self.rows)
+            if numpy is not None:
+                yield self.__encode_numpy(start, stop), stop - start
+            else:
+                yield self.__encode_array(start, stop), stop - start
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+from ignite.binary import BinaryObject
+from struct import Struct
+
+
+class CacheConfigurationException(Exception):
+    pass
+
+
+class CacheConfiguration:
+    """
+    Cache configuration of OP_CACHE_CREATE_WITH_CONFIGURATION and OP_CACHE_GET_CONFIGURATION.
+    Only the properties which are set are sent on the cache creation, the server defaults are used for the rest.
+    The enumerations are set by their names, e.g. atomicity_mode='ATOMIC'.
+    """
+
+    # Properties in the order of OP_CACHE_GET_CONFIGURATION response with their codes of the creation request
+    properties = [
+        ('atomicity_mode', 2, 'int'),
+        ('backups', 3, 'int'),
+        ('cache_mode', 1, 'int'),
+        ('copy_on_read', 5, 'bool'),
+        ('data_region_name', 100, 'string'),
+        ('eager_ttl', 405, 'bool'),
+        ('statistics_enabled', 406, 'bool'),
+        ('group_name', 400, 'string'),
+        ('default_lock_timeout', 402, 'long'),
+        ('max_concurrent_async_operations', 403, 'int'),
+        ('max_query_iterators', 206, 'int'),
+        ('name', 0, 'string'),
+        ('onheap_cache_enabled', 101, 'bool'),
+        ('partition_loss_policy', 404, 'int'),
+        ('query_detail_metrics_size', 202, 'int'),
+        ('query_parallelism', 201, 'int'),
+        ('read_from_backup', 6, 'bool'),
+        ('rebalance_batch_size', 303, 'int'),
+        ('rebalance_batches_prefetch_count', 304, 'long'),
+        ('rebalance_delay', 301, 'long'),
+        ('rebalance_mode', 300, 'int'),
+        ('rebalance_order', 305, 'int'),
+        ('rebalance_throttle', 306, 'long'),
+        ('rebalance_timeout', 302, 'long'),
+        ('sql_escape_all', 205, 'bool'),
+        ('sql_index_inline_max_size', 204, 'int'),
+        ('sql_schema', 203, 'string'),
+        ('write_synchronization_mode', 4, 'int'),
+    ]
+
+    key_configurations_code = 401
+
+    enums = {
+        'atomicity_mode': ['TRANSACTIONAL', 'ATOMIC'],
+        'cache_mode': ['LOCAL', 'REPLICATED', 'PARTITIONED'],
+        'partition_loss_policy': ['READ_ONLY_SAFE', 'READ_ONLY_ALL', 'READ_WRITE_SAFE', 'READ_WRITE_ALL', 'IGNORE'],
+        'rebalance_mode': ['SYNC', 'ASYNC', 'NONE'],
+        'write_synchronization_mode': ['FULL_SYNC', 'FULL_ASYNC', 'PRIMARY_SYNC'],
+    }
+
+    # Defaults of Ignite CacheConfiguration
+    defaults = {
+        'atomicity_mode': 'ATOMIC',
+        'backups': 0,
+        'cache_mode': 'PARTITIONED',
+        'copy_on_read': True,
+        'eager_ttl': True,
+        'statistics_enabled': False,
+        'default_lock_timeout': 0,
+        'max_concurrent_async_operations': 500,
+        'max_query_iterators': 1024,
+        'onheap_cache_enabled': False,
+        'partition_loss_policy': 'IGNORE',
+        'query_detail_metrics_size': 0,
+        'query_parallelism': 1,
+        'read_from_backup': True,
+        'rebalance_batch_size': 512 * 1024,
+        'rebalance_batches_prefetch_count': 2,
+        'rebalance_delay': 0,
+        'rebalance_mode': 'ASYNC',
+        'rebalance_order': 0,
+        'rebalance_throttle': 0,
+        'rebalance_timeout': 10000,
+        'sql_escape_all': False,
+        'sql_index_inline_max_size': -1,
+        'write_synchronization_mode': 'PRIMARY_SYNC',
+    }
+
+    structs = {'int': Struct('<i'), 'long': Struct('<q'), 'bool': Struct('<?'), 'short': Struct('<h')}
+
+    def __init__(self, name, **kwargs):
+        """
+        :param      name:   The cache name.
+                    kwargs: The properties, e.g. backups=1, write_synchronization_mode='PRIMARY_SYNC'.
+                            key_configurations - the list of (type name, affinity key field name).
+        """
+        self.values = {'name': name}
+        self.key_configurations = kwargs.pop('key_configurations', None)
+        names = [prop_name for prop_name, code, prop_type in self.properties]
+        for prop_name, value in kwargs.items():
+            if prop_name not in names:
+                raise CacheConfigurationException("Unknown cache property %s" % prop_name)
+            if prop_name in self.enums and value is not None and value not in self.enums[prop_name]:
+                raise CacheConfigurationException("Value %s of %s is not one of %s"
+                                                  % (value, prop_name, self.enums[prop_name]))
+            self.values[prop_name] = value
+
+    def __getattr__(self, prop_name):
+        values = self.__dict__.get('values', {})
+        if prop_name in values:
+            return values[prop_name]
+        if prop_name in [name for name, code, prop_type in self.properties]:
+            return None
+        raise AttributeError(prop_name)
+
+    def __eq__(self, other):
+        return isinstance(other, CacheConfiguration) and self.values == other.values \
+            and self.key_configurations == other.key_configurations
+
+    def __repr__(self):
+        return "CacheConfiguration(%s)" % ', '.join('%s=%r' % item for item in sorted(self.values.items()))
+
+    def __encode_value(self, prop_name, prop_type, value):
+        if prop_type == 'string':
+            # Strings are data objects with the type code
+            return BinaryObject().load_value(value).serialize(type='string' if value is not None else None)
+        if prop_name in self.enums:
+            value = self.enums[prop_name].index(value)
+        return self.structs[prop_type].pack(value)
+
+    def __encode_key_configurations(self):
+        encoded = self.structs['int'].pack(len(self.key_configurations))
+        for type_name, affinity_key_field_name in self.key_configurations:
+            encoded += BinaryObject().load_value(type_name).serialize()
+            encoded += BinaryObject().load_value(affinity_key_field_name).serialize()
+        return encoded
+
+    def serialize_properties(self):
+        """
+        Encode the properties which are set for the cache creation request.
+        """
+        encoded = b''
+        count = 0
+        for prop_name, code, prop_type in self.properties:
+            if self.values.get(prop_name) is not None:
+                encoded += self.structs['short'].pack(code)
+                encoded += self.__encode_value(prop_name, prop_type, self.values[prop_name])
+                count += 1
+        if self.key_configurations is not None:
+            encoded += self.structs['short'].pack(self.key_configurations_code) + self.__encode_key_configurations()
+            count += 1
+        encoded = self.structs['short'].pack(count) + encoded
+        return self.structs['int'].pack(len(encoded)) + encoded
+
+    def serialize(self):
+        """
+        Encode all the properties as the configuration response, the defaults are used for the properties not set.
+        """
+        encoded = b''
+        for prop_name, code, prop_type in self.properties:
+            value = self.values.get(prop_name)
+            if value is None:
+                value = self.defaults.get(prop_name)
+            if value is None and prop_type != 'string':
+                raise CacheConfigurationException("No value of %s" % prop_name)
+            encoded += self.__encode_value(prop_name, prop_type, value)
+        if self.key_configurations is not None:
+            encoded += self.__encode_key_configurations()
+        else:
+            encoded += self.structs['int'].pack(0)
+        # No query entities
+        encoded += self.structs['int'].pack(0)
+        return self.structs['int'].pack(len(encoded)) + encoded
+
+    @classmethod
+    def deserialize(cls, binary, pos=0):
+        """
+        Decode the configuration response. The query entities are not decoded.
+        """
+        bin_obj = BinaryObject()
+        values = {}
+        pos += 4
+        for prop_name, code, prop_type in cls.properties:
+            if prop_type == 'string':
+                value, pos = bin_obj.deserialize_entry(binary, pos, is_single_type=True)
+            else:
+                value, = cls.structs[prop_type].unpack_from(binary, pos)
+                pos += cls.structs[prop_type].size
+                if prop_name in cls.enums:
+                    value = cls.enums[prop_name][value]
+            values[prop_name] = value
+        key_configurations_count, = cls.structs['int'].unpack_from(binary, pos)
+        pos += 4
+        key_configurations = bin_obj.load_bytes(binary).deserialize_entries(2 * key_configurations_count, pos)
+        values['key_configurations'] = list(zip(key_configurations[0::2], key_configurations[1::2]))
+        return cls(**values)
+
+    @classmethod
+    def deserialize_properties(cls, binary, pos=0):
+        """
+        Decode the properties of the creation request.
+        """
+        bin_obj = BinaryObject()
+        types = {code: (prop_name, prop_type) for prop_name, code, prop_type in cls.properties}
+        values = {}
+        pos += 4
+        count, = cls.structs['short'].unpack_from(binary, pos)
+        pos += 2
+        for idx in range(0, count):
+            code, = cls.structs['short'].unpack_from(binary, pos)
+            pos += 2
+            if code == cls.key_configurations_code:
+                key_configurations_count, = cls.structs['int'].unpack_from(binary, pos)
+                key_configurations = bin_obj.load_bytes(binary).deserialize_entries(
+                    2 * key_configurations_count, pos + 4
+                )
+                pos = bin_obj.skip_entries(2 * key_configurations_count, pos + 4)
+                values['key_configurations'] = list(zip(key_configurations[0::2], key_configurations[1::2]))
+                continue
+            if code not in types:
+                raise CacheConfigurationException("Unknown cache property code %s" % code)
+            prop_name, prop_type = types[code]
+            if prop_type == 'string':
+                value, pos = bin_obj.deserialize_entry(binary, pos, is_single_type=True)
+            else:
+                value, = cls.structs[prop_type].unpack_from(binary, pos)
+                pos += cls.structs[prop_type].size
+                if prop_name in cls.enums:
+                    value = cls.enums[prop_name][value]
+            values[prop_name] = value
+        return cls(**values)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+from array import array
+from random import random
+from threading import Lock
+from time import time
+
+
+class CountMinSketch:
+    """
+    Count-Min sketch: depth rows of width counters, the estimate of a key is the minimum of its counters,
+    it's never less than the real count.
+    """
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.rows = [array('q', [0] * width) for idx in range(0, depth)]
+
+    @staticmethod
+    def __cell_hash(key_hash, idx):
+        # splitmix64 of the key hash and the row, hash((idx, key)) of the rows collide together for close keys
+        value = (key_hash + (idx + 1) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+        return value ^ (value >> 31)
+
+    def add(self, key, count=1):
+        estimate = None
+        key_hash = hash(key)
+        for idx, row in enumerate(self.rows):
+            cell = self.__cell_hash(key_hash, idx) % self.width
+            row[cell] += count
+            if estimate is None or row[cell] < estimate:
+                estimate = row[cell]
+        return estimate
+
+
+class CacheHotKeys:
+
+    def __init__(self, width, depth, top):
+        self.sketch = CountMinSketch(width, depth)
+        self.top = top
+        # Statistics of the top keys since they are in the top
+        self.keys = {}
+
+    def add(self, key, access, size):
+        # 1 and True are separate hot keys
+        typed_key = (type(key), key)
+        estimate = self.sketch.add(typed_key)
+        stats = self.keys.get(typed_key)
+        if stats is None:
+            if len(self.keys) >= self.top:
+                coldest = min(self.keys, key=lambda top_key: self.keys[top_key]['count'])
+                if self.keys[coldest]['count'] >= estimate:
+                    return
+                del self.keys[coldest]
+            stats = {'key': key, 'count': 0, 'reads': 0, 'writes': 0, 'bytes': 0, 'since': time()}
+            self.keys[typed_key] = stats
+        stats['count'] = estimate
+        stats[access] += 1
+        stats['bytes'] += size
+
+
+class HotKeyTracker:
+    """
+    Sampled statistics of the hottest keys by cache. Every sampled operation adds its keys to the Count-Min sketch
+    of the cache, the top keys by the sketch estimates are kept with their reads, writes and payload sizes.
+    The memory is bounded by the sketch size and the number of top keys per cache.
+    """
+
+    def __init__(self, sample_rate=0.01, top=20, width=2048, depth=4):
+        self.sample_rate = sample_rate
+        self.top = top
+        self.width = width
+        self.depth = depth
+        self.caches = {}
+        self.lock = Lock()
+
+    def sampled(self):
+        return random() < self.sample_rate
+
+    def record(self, cache, keys, access, size):
+        """
+        Add the keys of the sampled operation.
+        :param      cache:  The cache name.
+                    keys:   The list of keys.
+                    access: 'reads' or 'writes'.
+                    size:   The payload size of the operation, it's divided between the keys.
+        """
+        if len(keys) == 0:
+            return
+        key_size = size / len(keys)
+        with self.lock:
+            cache_hot_keys = self.caches.get(cache)
+            if cache_hot_keys is None:
+                cache_hot_keys = CacheHotKeys(self.width, self.depth, self.top)
+                self.caches[cache] = cache_hot_keys
+            for key in keys:
+                try:
+                    cache_hot_keys.add(key, access, key_size)
+                except TypeError:
+                    # Not hashable keys are not tracked
+                    pass
+
+    def hot_keys(self, cache, count=10):
+        """
+        Get the hottest keys of the cache.
+        :return:    The list of dictionaries with the key, the estimated number of operations, the estimated rates
+                    of reads and writes per second and the average payload size in bytes, the hottest keys first.
+        """
+        now = time()
+        with self.lock:
+            cache_hot_keys = self.caches.get(cache)
+            if cache_hot_keys is None:
+                return []
+            hot_keys = []
+            for stats in cache_hot_keys.keys.values():
+                elapsed = max(now - stats['since'], 1e-3)
+                accesses = stats['reads'] + stats['writes']
+                hot_keys.append({
+                    'key': stats['key'],
+                    'count': int(stats['count'] / self.sample_rate),
+                    'read_rate': stats['reads'] / self.sample_rate / elapsed,
+                    'write_rate': stats['writes'] / self.sample_rate / elapsed,
+                    'size': stats['bytes'] / accesses if accesses > 0 else 0,
+                })
+        hot_keys.sort(key=lambda hot_key: hot_key['count'], reverse=True)
+        return hot_keys[:count]
+
+    def reset(self):
+        with self.lock:
+            self.caches = {}
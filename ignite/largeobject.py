@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+from collections import deque
+from concurrent.futures import Future, wait
+from uuid import uuid4
+
+
+class LargeObjectException(Exception):
+    pass
+
+
+class LargeObjectStore:
+    """
+    Store of big byte values split into fixed size chunks under derived keys. The manifest with the size,
+    the chunk size and the version of the value is stored under the key itself after all the chunks are written,
+    so a reader never sees a partially written value. The chunks of the previous version are removed after that.
+    The chunks are written and read in batches of put_all and get_all, with ThinClientPool the batches are sent
+    in parallel connections, with ThinClient they are sent one by one.
+    """
+
+    def __init__(self, client, cache, **kwargs):
+        """
+        :param      client: ThinClient or ThinClientPool.
+                    cache:  The cache name.
+                    kwargs: chunk_size - the size of a chunk in bytes, 1 MB by default.
+                            batch_chunks - the number of chunks in one put_all or get_all request.
+                            window - the maximal number of batches in progress, it bounds the memory
+                            used by the requests and responses.
+        """
+        self.client = client
+        self.cache = cache
+        self.chunk_size = kwargs.get('chunk_size', 1024 * 1024)
+        self.batch_chunks = kwargs.get('batch_chunks', 4)
+        self.window = kwargs.get('window', 4)
+
+    def __call(self, method_name, *args, **kwargs):
+        if hasattr(self.client, 'submit'):
+            return self.client.submit(method_name, *args, **kwargs)
+        future = Future()
+        try:
+            future.set_result(getattr(self.client, method_name)(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+    def __pipeline(self, calls):
+        # Keep at most window calls in progress, the results are yielded in the order of calls
+        in_progress = deque()
+        try:
+            for tag, method_name, args in calls:
+                in_progress.append((tag, self.__call(method_name, *args)))
+                if len(in_progress) >= self.window:
+                    tag, future = in_progress.popleft()
+                    yield tag, future.result()
+            while len(in_progress) > 0:
+                tag, future = in_progress.popleft()
+                yield tag, future.result()
+        except BaseException:
+            # The calls in progress are finished before the failure is raised, so the cleanup is not overtaken
+            wait([future for tag, future in in_progress])
+            raise
+
+    @staticmethod
+    def __check_manifest(key, manifest):
+        if not isinstance(manifest, dict) or not {'size', 'chunk_size', 'version'} <= manifest.keys():
+            raise LargeObjectException("Value of %r is not a large object" % (key,))
+
+    @staticmethod
+    def chunk_key(key, version, idx):
+        return '%r#%s#%s' % (key, version, idx)
+
+    def __chunk_keys(self, key, manifest):
+        chunks = (manifest['size'] + manifest['chunk_size'] - 1) // manifest['chunk_size']
+        return [self.chunk_key(key, manifest['version'], idx) for idx in range(0, chunks)]
+
+    def __remove_chunks(self, key, manifest):
+        self.__call('cache_remove_keys', self.cache, self.__chunk_keys(key, manifest)).result()
+
+    def put(self, key, value):
+        """
+        Store the value.
+        :param      key:    The key.
+                    value:  bytes, bytearray or memoryview, the chunks are slices of the value without copying.
+        """
+        view = memoryview(value).cast('B')
+        old_manifest = self.__call('cache_get', self.cache, key).result()
+        manifest = {'size': len(view), 'chunk_size': self.chunk_size, 'version': uuid4().hex}
+        chunk_keys = self.__chunk_keys(key, manifest)
+        calls = []
+        for start in range(0, len(chunk_keys), self.batch_chunks):
+            batch = {}
+            for idx in range(start, min(start + self.batch_chunks, len(chunk_keys))):
+                batch[chunk_keys[idx]] = view[idx*self.chunk_size:(idx+1)*self.chunk_size]
+            calls.append((start, 'cache_put_all', [self.cache, batch]))
+        try:
+            for start, result in self.__pipeline(calls):
+                pass
+        except BaseException:
+            self.__remove_chunks(key, manifest)
+            raise
+        self.__call('cache_put', self.cache, key, manifest).result()
+        if isinstance(old_manifest, dict) and {'size', 'chunk_size', 'version'} <= old_manifest.keys():
+            self.__remove_chunks(key, old_manifest)
+
+    def get(self, key, buffer=None):
+        """
+        Read the value.
+        :param      key:    The key.
+                    buffer: The writable buffer of the value size to read to, it's allocated if None.
+        :return:    The bytearray or the buffer with the value, None if there is no value.
+                    LargeObjectException is raised if the value is not a large object.
+        """
+        manifest = self.__call('cache_get', self.cache, key).result()
+        if manifest is None:
+            return None
+        self.__check_manifest(key, manifest)
+        if buffer is None:
+            buffer = bytearray(manifest['size'])
+        view = memoryview(buffer).cast('B')
+        if len(view) != manifest['size']:
+            raise LargeObjectException("Buffer size %s does not match value size %s" % (len(view), manifest['size']))
+        chunk_keys = self.__chunk_keys(key, manifest)
+        calls = []
+        for start in range(0, len(chunk_keys), self.batch_chunks):
+            calls.append((start, 'cache_get_all', [self.cache, chunk_keys[start:start+self.batch_chunks]]))
+        chunk_size = manifest['chunk_size']
+        for start, chunks in self.__pipeline(calls):
+            for idx in range(start, min(start + self.batch_chunks, len(chunk_keys))):
+                chunk = chunks.get(chunk_keys[idx])
+                if chunk is None:
+                    raise LargeObjectException("Chunk %s of %r is missing, the value was replaced or removed"
+                                               % (idx, key))
+                view[idx*chunk_size:idx*chunk_size+len(chunk)] = chunk
+        return buffer
+
+    def remove(self, key):
+        """
+        Remove the value and its chunks.
+        :return:    True if the value existed, LargeObjectException is raised if it's not a large object.
+        """
+        manifest = self.__call('cache_get', self.cache, key).result()
+        if manifest is None:
+            return False
+        self.__check_manifest(key, manifest)
+        self.__call('cache_remove_key', self.cache, key).result()
+        self.__remove_chunks(key, manifest)
+        return True
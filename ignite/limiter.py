@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+from threading import Lock
+
+
+class AIMDLimiter:
+    """
+    Limit of concurrent operations by additive increase and multiplicative decrease (as TCP congestion control).
+    The limit grows by one per limit of successful operations while the concurrency is used and it's cut by
+    backoff_ratio when an operation fails with a timeout or a connection error or its latency exceeds
+    the tolerance times the baseline latency. The baseline is the minimal latency slowly drifting upwards.
+    """
+
+    def __init__(self, max_limit, **kwargs):
+        self.max_limit = max_limit
+        self.min_limit = kwargs.get('min_limit', 1)
+        self.backoff_ratio = kwargs.get('backoff_ratio', 0.9)
+        self.tolerance = kwargs.get('tolerance', 2.0)
+        self.baseline_drift = kwargs.get('baseline_drift', 0.001)
+        self.estimate = float(kwargs.get('initial_limit', max_limit))
+        self.baseline = None
+        # Number of operations since the last decrease, the limit is decreased once per congestion
+        self.since_decrease = 0
+        self.lock = Lock()
+
+    @property
+    def limit(self):
+        return max(self.min_limit, int(self.estimate))
+
+    def update(self, latency, in_flight, dropped=False):
+        """
+        Update the limit with the result of an operation.
+        :param      latency:    The operation time, seconds.
+                    in_flight:  The number of operations in progress when the operation started.
+                    dropped:    True if the operation failed because of a timeout or a connection error.
+        """
+        with self.lock:
+            self.since_decrease += 1
+            if not dropped:
+                if self.baseline is None or latency < self.baseline:
+                    self.baseline = latency
+                else:
+                    self.baseline += (latency - self.baseline) * self.baseline_drift
+            if dropped or latency > self.baseline * self.tolerance:
+                if self.since_decrease >= self.limit:
+                    self.estimate = max(self.min_limit, self.estimate * self.backoff_ratio)
+                    self.since_decrease = 0
+            elif 2 * in_flight >= self.limit:
+                # The limit is not increased while the concurrency is not used
+                self.estimate = min(self.max_limit, self.estimate + 1 / self.estimate)
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+
+from argparse import ArgumentParser
+from ignite.binary import BinaryObject
+from ignite.configuration import CacheConfiguration
+from ignite.sync import affinity_partition, SyncException
+from ignite.thinclient import java_string_hashcode, ThinClient
+from socketserver import BaseRequestHandler, ThreadingTCPServer
+from threading import Lock, Thread
+from time import sleep
+from zlib import crc32
+
+
+class MockServerException(Exception):
+    pass
+
+
+class MockServerHandler(BaseRequestHandler):
+
+    def __receive_bytes(self, size):
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        pos = 0
+        while pos < size:
+            received = self.request.recv_into(view[pos:], size - pos)
+            if received == 0:
+                raise EOFError()
+            pos += received
+        return buffer
+
+    def handle(self):
+        server = self.server.mock
+        try:
+            # The first message is always a handshake
+            header = self.__receive_bytes(4)
+            self.__receive_bytes(int.from_bytes(header, byteorder='little'))
+            self.request.sendall(b'\x01\x00\x00\x00\x01')
+            while True:
+                header = self.__receive_bytes(4)
+                body = self.__receive_bytes(int.from_bytes(header, byteorder='little'))
+                if server.delay > 0:
+                    sleep(server.delay)
+                self.request.sendall(server.process(body))
+        except (EOFError, OSError):
+            pass
+
+
+class MockServer:
+    """
+    Pure python server of the thin client protocol for the operations of ThinClient.packet_formats.
+    Keys and values are stored as binary objects, the keys are compared by their binary form.
+    """
+
+    null = b'\x65'
+
+    def __init__(self, host='127.0.0.1', port=0, caches=None, partitions=1024, delay=0, filters=None):
+        self.partitions = partitions
+        # Processing time of every request in seconds to simulate a slow node
+        self.delay = delay
+        # Scan query filters by class name, python callables of key, value and the filter object
+        self.filters = filters or {}
+        self.type_names = {}
+        self.caches = {}
+        self.names = {}
+        self.configurations = {}
+        self.cursors = {}
+        self.cursor_id = 0
+        self.lock = Lock()
+        for cache in caches or []:
+            self.create_cache(cache)
+        self.operations = {}
+        for operation, packet_format in ThinClient.packet_formats.items():
+            handler = getattr(self, 'op_%s' % operation[3:].lower(), None)
+            if operation.startswith('OP_') and handler is not None:
+                self.operations[packet_format['code']] = handler
+        ThreadingTCPServer.allow_reuse_address = True
+        self.tcp_server = ThreadingTCPServer((host, port), MockServerHandler)
+        self.tcp_server.daemon_threads = True
+        self.tcp_server.mock = self
+        self.thread = None
+
+    @property
+    def address(self):
+        return self.tcp_server.server_address
+
+    def start(self):
+        self.thread = Thread(target=self.tcp_server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.tcp_server.shutdown()
+        self.tcp_server.server_close()
+
+    def create_cache(self, name, configuration=None):
+        cache_id = java_string_hashcode(name)
+        if cache_id in self.caches:
+            raise MockServerException("Failed to start cache (a cache with the same name is already started): %s"
+                                      % name)
+        self.caches[cache_id] = {}
+        self.names[cache_id] = name
+        self.configurations[cache_id] = configuration or CacheConfiguration(name)
+
+    def partition(self, key):
+        # The partitions of primitive and string keys are the same as of Ignite
+        try:
+            return affinity_partition(key, self.partitions)
+        except SyncException:
+            return crc32(key) % self.partitions
+
+    def process(self, body):
+        op_code = int.from_bytes(body[0:2], byteorder='little')
+        request_id = bytes(body[2:10])
+        try:
+            handler = self.operations.get(op_code)
+            if handler is None:
+                raise MockServerException("Unsupported operation %s" % op_code)
+            with self.lock:
+                payload = handler(body, 10)
+            status = 0
+        except Exception as e:
+            payload = BinaryObject().load_value(str(e)).serialize()
+            status = 1
+        response = request_id + status.to_bytes(4, byteorder='little') + payload
+        return len(response).to_bytes(4, byteorder='little') + response
+
+    @staticmethod
+    def read_object(body, pos):
+        value, end_pos = BinaryObject().deserialize_entry(body, pos, is_single_type=True)
+        return bytes(body[pos:end_pos]), end_pos
+
+    def read_objects(self, body, pos, count):
+        objects = []
+        for idx in range(0, count):
+            obj, pos = self.read_object(body, pos)
+            objects.append(obj)
+        return objects, pos
+
+    def read_cache(self, body, pos):
+        # cache_id and flags
+        cache_id = int.from_bytes(body[pos:pos+4], byteorder='little', signed=True)
+        if cache_id not in self.caches:
+            raise MockServerException("Cache does not exist [cacheId= %s]" % cache_id)
+        return self.caches[cache_id], pos + 5
+
+    def read_key_values(self, body, pos, count):
+        cache, pos = self.read_cache(body, pos)
+        objects, pos = self.read_objects(body, pos, count)
+        return cache, objects
+
+    def read_keys(self, body, pos):
+        cache, pos = self.read_cache(body, pos)
+        count = int.from_bytes(body[pos:pos+4], byteorder='little')
+        objects, pos = self.read_objects(body, pos + 4, count)
+        return cache, objects
+
+    @staticmethod
+    def bool(value):
+        if value:
+            return b'\x01'
+        return b'\x00'
+
+    def op_cache_get(self, body, pos):
+        cache, (key, ) = self.read_key_values(body, pos, 1)
+        return cache.get(key, self.null)
+
+    def op_cache_put(self, body, pos):
+        cache, (key, value) = self.read_key_values(body, pos, 2)
+        cache[key] = value
+        return b''
+
+    def op_cache_put_if_absent(self, body, pos):
+        cache, (key, value) = self.read_key_values(body, pos, 2)
+        if key in cache:
+            return self.bool(False)
+        cache[key] = value
+        return self.bool(True)
+
+    def op_cache_get_all(self, body, pos):
+        cache, keys = self.read_keys(body, pos)
+        pairs = [(key, cache[key]) for key in keys if key in cache]
+        return len(pairs).to_bytes(4, byteorder='little') + b''.join(key + value for key, value in pairs)
+
+    def op_cache_put_all(self, body, pos):
+        cache, pos = self.read_cache(body, pos)
+        count = int.from_bytes(body[pos:pos+4], byteorder='little')
+        objects, pos = self.read_objects(body, pos + 4, 2*count)
+        for idx in range(0, len(objects), 2):
+            cache[objects[idx]] = objects[idx+1]
+        return b''
+
+    def op_cache_get_and_put(self, body, pos):
+        cache, (key, value) = self.read_key_values(body, pos, 2)
+        old_value = cache.get(key, self.null)
+        cache[key] = value
+        return old_value
+
+    def op_cache_get_and_replace(self, body, pos):
+        cache, (key, value) = self.read_key_values(body, pos, 2)
+        old_value = cache.get(key, self.null)
+        if key in cache:
+            cache[key] = value
+        return old_value
+
+    def op_cache_get_and_remove(self, body, pos):
+        cache, (key, ) = self.read_key_values(body, pos, 1)
+        return cache.pop(key, self.null)
+
+    def op_cache_get_and_put_if_absent(self, body, pos):
+        cache, (key, value) = self.read_key_values(body, pos, 2)
+        old_value = cache.get(key, self.null)
+        if key not in cache:
+            cache[key] = value
+        return old_value
+
+    def op_cache_replace(self, body, pos):
+        cache, (key, value) = self.read_key_values(body, pos, 2)
+        if key not in cache:
+            return self.bool(False)
+        cache[key] = value
+        return self.bool(True)
+
+    def op_cache_replace_if_equals(self, body, pos):
+        cache, (key, old_value, value) = self.read_key_values(body, pos, 3)
+        if cache.get(key) != old_value:
+            return self.bool(False)
+        cache[key] = value
+        return self.bool(True)
+
+    def op_cache_contains_key(self, body, pos):
+        cache, (key, ) = self.read_key_values(body, pos, 1)
+        return self.bool(key in cache)
+
+    def op_cache_contains_keys(self, body, pos):
+        cache, keys = self.read_keys(body, pos)
+        return self.bool(all(key in cache for key in keys))
+
+    def op_cache_clear(self, body, pos):
+        cache, pos = self.read_cache(body, pos)
+        cache.clear()
+        return b''
+
+    def op_cache_clear_key(self, body, pos):
+        cache, (key, ) = self.read_key_values(body, pos, 1)
+        cache.pop(key, None)
+        return b''
+
+    def op_cache_clear_keys(self, body, pos):
+        cache, keys = self.read_keys(body, pos)
+        for key in keys:
+            cache.pop(key, None)
+        return b''
+
+    def op_cache_remove_key(self, body, pos):
+        cache, (key, ) = self.read_key_values(body, pos, 1)
+        return self.bool(cache.pop(key, None) is not None)
+
+    def op_cache_remove_if_equals(self, body, pos):
+        cache, (key, value) = self.read_key_values(body, pos, 2)
+        if key not in cache or cache[key] != value:
+            return self.bool(False)
+        del cache[key]
+        return self.bool(True)
+
+    def op_cache_remove_keys(self, body, pos):
+        return self.op_cache_clear_keys(body, pos)
+
+    def op_cache_remove_all(self, body, pos):
+        return self.op_cache_clear(body, pos)
+
+    def op_cache_get_size(self, body, pos):
+        cache, pos = self.read_cache(body, pos)
+        return len(cache).to_bytes(8, byteorder='little')
+
+    def op_cache_get_names(self, body, pos):
+        names = sorted(self.names.values())
+        return len(names).to_bytes(4, byteorder='little') \
+            + b''.join(BinaryObject().load_value(name).serialize() for name in names)
+
+    def op_cache_create_with_name(self, body, pos):
+        name, pos = BinaryObject().deserialize_entry(body, pos, is_single_type=True)
+        self.create_cache(name)
+        return b''
+
+    def op_cache_create_with_configuration(self, body, pos):
+        configuration = CacheConfiguration.deserialize_properties(body, pos)
+        self.create_cache(configuration.name, configuration)
+        return b''
+
+    def op_cache_get_or_create_with_configuration(self, body, pos):
+        configuration = CacheConfiguration.deserialize_properties(body, pos)
+        if java_string_hashcode(configuration.name) not in self.caches:
+            self.create_cache(configuration.name, configuration)
+        return b''
+
+    def op_cache_get_configuration(self, body, pos):
+        cache_id = int.from_bytes(body[pos:pos+4], byteorder='little', signed=True)
+        self.read_cache(body, pos)
+        return self.configurations[cache_id].serialize()
+
+    def op_cache_destroy(self, body, pos):
+        cache_id = int.from_bytes(body[pos:pos+4], byteorder='little', signed=True)
+        if cache_id not in self.caches:
+            raise MockServerException("Cache does not exist [cacheId= %s]" % cache_id)
+        del self.caches[cache_id]
+        del self.names[cache_id]
+        del self.configurations[cache_id]
+        return b''
+
+    def op_register_binary_type_name(self, body, pos):
+        type_id = int.from_bytes(body[pos+1:pos+5], byteorder='little', signed=True)
+        name, pos = BinaryObject().deserialize_entry(body, pos + 5, is_single_type=True)
+        self.type_names[type_id] = name
+        return b''
+
+    def scan_filter(self, filter_object):
+        class_name = self.type_names.get(filter_object.type_id)
+        if class_name not in self.filters:
+            raise MockServerException("Failed to resolve class of scan query filter [typeId=%s, className=%s]"
+                                      % (filter_object.type_id, class_name))
+        predicate = self.filters[class_name]
+
+        def apply(pair):
+            key = BinaryObject().load_bytes(pair[0]).deserialize()
+            value = BinaryObject().load_bytes(pair[1]).deserialize()
+            return predicate(key, value, filter_object)
+        return apply
+
+    def scan_page(self, cursor_id):
+        cursor = self.cursors[cursor_id]
+        pairs = cursor['pairs'][cursor['pos']:cursor['pos'] + cursor['page_size']]
+        cursor['pos'] += cursor['page_size']
+        has_more = cursor['pos'] < len(cursor['pairs'])
+        if not has_more:
+            del self.cursors[cursor_id]
+        return len(pairs).to_bytes(4, byteorder='little') \
+            + b''.join(key + value for key, value in pairs) + self.bool(has_more)
+
+    def op_scan_query(self, body, pos):
+        cache, pos = self.read_cache(body, pos)
+        filter_object, pos = BinaryObject().deserialize_entry(body, pos, is_single_type=True)
+        if filter_object is not None:
+            # Filter platform, only Java filters are emulated
+            pos += 1
+        page_size = int.from_bytes(body[pos:pos+4], byteorder='little')
+        partition = int.from_bytes(body[pos+4:pos+8], byteorder='little', signed=True)
+        pairs = list(cache.items())
+        if partition >= 0:
+            pairs = [(key, value) for key, value in pairs if self.partition(key) == partition]
+        if filter_object is not None:
+            pairs = list(filter(self.scan_filter(filter_object), pairs))
+        self.cursor_id += 1
+        self.cursors[self.cursor_id] = {'pairs': pairs, 'pos': 0, 'page_size': page_size}
+        return self.cursor_id.to_bytes(8, byteorder='little') + self.scan_page(self.cursor_id)
+
+    def op_query_scan_cursor_get_page(self, body, pos):
+        cursor_id = int.from_bytes(body[pos:pos+8], byteorder='little')
+        if cursor_id not in self.cursors:
+            raise MockServerException("Failed to find resource with id: %s" % cursor_id)
+        return self.scan_page(cursor_id)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Mock server of Apache Ignite thin client protocol')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=10800)
+    parser.add_argument('--cache', action='append', default=[], help='Cache to create on start, can be repeated')
+    parser.add_argument('--partitions', type=int, default=1024)
+    parser.add_argument('--delay', type=float, default=0, help='Processing time of every request, seconds')
+    options = parser.parse_args()
+    mock = MockServer(options.host, options.port, options.cache, options.partitions, options.delay)
+    print("Mock server is listening on %s:%s" % mock.address)
+    mock.tcp_server.serve_forever()
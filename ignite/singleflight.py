@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from threading import Lock
+from time import time
+
+
+class SingleFlight:
+    """
+    Collapsing of concurrent identical calls: the first caller of a key runs the call, the callers of the same key
+    coming while it's in progress wait for it and get the same result or exception. The next call of the key
+    after the result is received runs again, nothing is cached.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = Lock()
+        # The number of the calls answered by the call of another caller
+        self.collapsed = 0
+
+    @staticmethod
+    def key(*args, key_set=None, **kwargs):
+        """
+        Build the key of the call from its arguments and their types, lists and tuples are compared item by item.
+        :param      args, kwargs:   The arguments of the call.
+                    key_set:        The collection of the cache keys which order and duplicates do not matter,
+                                    e.g. of cache_get_all.
+        :return:    The hashable key or None if some argument is not hashable, such calls are not collapsed.
+        """
+        try:
+            key = (SingleFlight.__typed(args), frozenset((name, SingleFlight.__typed(value))
+                                                         for name, value in kwargs.items()))
+            if key_set is not None:
+                key += (frozenset(SingleFlight.__typed(item) for item in key_set),)
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    @staticmethod
+    def __typed(value):
+        if isinstance(value, (list, tuple)):
+            return type(value), tuple(SingleFlight.__typed(item) for item in value)
+        return type(value), value
+
+    def begin(self, key):
+        """
+        Join the call of the key in progress or start a new one.
+        :return:    (future, leader): the future of the call result and True if the caller has to run the call
+                    and report its result with end.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                self.collapsed += 1
+                return call, False
+            call = Future()
+            self.calls[key] = call
+            return call, True
+
+    def end(self, key, call, result=None, exception=None):
+        with self.lock:
+            if self.calls.get(key) is call:
+                del self.calls[key]
+        if exception is not None:
+            call.set_exception(exception)
+        else:
+            call.set_result(result)
+
+    def do(self, key, function, timeout=None, retry=()):
+        """
+        Run the function once for all the concurrent callers of the key.
+        :param      key:        The key of the call, see SingleFlight.key.
+                    function:   The function without arguments.
+                    timeout:    The maximal time to wait for the call of another caller, seconds,
+                                concurrent.futures.TimeoutError is raised when it's exceeded.
+                    retry:      The exceptions of another caller to run the call again instead of raising them,
+                                e.g. the timeout of the caller which time limit is less than this one.
+        :return:    The result of the function.
+        """
+        deadline = time() + timeout if timeout is not None else None
+        while True:
+            call, leader = self.begin(key)
+            if leader:
+                try:
+                    result = function()
+                except BaseException as e:
+                    self.end(key, call, exception=e)
+                    raise
+                self.end(key, call, result)
+                return result
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time()
+                if remaining <= 0:
+                    raise FutureTimeoutError()
+            try:
+                return call.result(remaining)
+            except retry:
+                continue
+
+    def reset(self):
+        """
+        Forget the calls in progress, e.g. the calls of the parent process after fork, the lock may be held there.
+        """
+        self.lock = Lock()
+        self.calls = {}
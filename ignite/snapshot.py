@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+
+
+class SnapshotException(Exception):
+    pass
+
+
+class SnapshotWriter:
+    """
+    Cache snapshot file: the scan pages of binary key-value pairs as they are received from the server
+    followed by the index of pages with their partition, offset, length and number of pairs.
+    """
+
+    magic = b'IGNSNAP1'
+    header = Struct('<8sq')
+    index_entry = Struct('<iqqi')
+
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        # The index offset is written on close, zero offset means the snapshot is incomplete
+        self.file.write(self.header.pack(self.magic, 0))
+        self.index = []
+
+    def write_page(self, partition, binary, count):
+        if count == 0:
+            return
+        self.index.append((partition, self.file.tell(), len(binary), count))
+        self.file.write(binary)
+
+    def close(self):
+        index_offset = self.file.tell()
+        self.file.write(len(self.index).to_bytes(4, byteorder='little'))
+        for index_entry in self.index:
+            self.file.write(self.index_entry.pack(*index_entry))
+        self.file.seek(0)
+        self.file.write(self.header.pack(self.magic, index_offset))
+        self.file.close()
+
+    def abort(self):
+        self.file.close()
+
+
+class SnapshotReader:
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            self.data = mmap(self.file.fileno(), 0, access=ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise SnapshotException("Snapshot file %s is empty" % path)
+        magic, index_offset = SnapshotWriter.header.unpack_from(self.data, 0)
+        if magic != SnapshotWriter.magic or index_offset == 0:
+            self.close()
+            raise SnapshotException("File %s is not a complete cache snapshot" % path)
+        index_len = int.from_bytes(self.data[index_offset:index_offset+4], byteorder='little')
+        self.index = []
+        pos = index_offset + 4
+        for idx in range(0, index_len):
+            self.index.append(SnapshotWriter.index_entry.unpack_from(self.data, pos))
+            pos += SnapshotWriter.index_entry.size
+
+    def partitions(self):
+        return sorted(set(index_entry[0] for index_entry in self.index))
+
+    def pages(self, partitions=None):
+        """
+        Iterate over the pages without copying them.
+        :param      partitions: The partitions to read, all the partitions are read if None.
+        :return:    The iterator of (partition, memoryview of binary key-value pairs, number of pairs),
+                    the memoryview is valid until the next page.
+        """
+        view = memoryview(self.data)
+        try:
+            for partition, offset, length, count in self.index:
+                if partitions is not None and partition not in partitions:
+                    continue
+                page = view[offset:offset+length]
+                try:
+                    yield partition, page, count
+                finally:
+                    page.release()
+        finally:
+            view.release()
+
+    def close(self):
+        self.data.close()
+        self.file.close()
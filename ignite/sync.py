@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+from hashlib import blake2b
+from ignite.binary import BinaryObject, java_string_hashcode
+from json import dump, load
+from struct import pack, unpack
+
+
+class SyncException(Exception):
+    pass
+
+
+def java_int(value):
+    return ((value + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
+def binary_hashcode(binary, pos=0):
+    """
+    Java hashCode of the primitive, string or UUID key encoded in binary format,
+    it's the hash code Ignite computes the partition of the key from.
+    The hash codes of other keys like binary objects are not known, SyncException is raised for them.
+    """
+    code = binary[pos]
+    value, end_pos = BinaryObject().deserialize_entry(binary, pos, is_single_type=True)
+    if code in [1, 2, 3]:
+        return value
+    elif code == 4:
+        return java_int(value ^ ((value & 0xFFFFFFFFFFFFFFFF) >> 32))
+    elif code == 5:
+        bits, = unpack('<i', pack('<f', value))
+        return bits
+    elif code == 6:
+        bits, = unpack('<q', pack('<d', value))
+        return java_int(bits ^ ((bits & 0xFFFFFFFFFFFFFFFF) >> 32))
+    elif code == 8:
+        return 1231 if value else 1237
+    elif code == 9:
+        return java_string_hashcode(value)
+    elif code == 10:
+        bits = unpack('>qq', value.bytes)
+        hilo = bits[0] ^ bits[1]
+        return java_int((hilo >> 32) ^ hilo)
+    raise SyncException("Partition of the key of type code %s is not known" % code)
+
+
+def affinity_partition(binary, partitions, pos=0):
+    # RendezvousAffinityFunction.calculatePartition
+    h = binary_hashcode(binary, pos)
+    if partitions & (partitions - 1) == 0:
+        return (h ^ ((h & 0xFFFFFFFF) >> 16)) & (partitions - 1)
+    return abs(h) % partitions
+
+
+class PartitionDigests:
+    """
+    Digests of the binary key-value pairs by partition. The digest of a partition is the sum of the pair hashes,
+    so it does not depend on the order of the pairs and the pairs are added one by one.
+    """
+
+    def __init__(self, partitions):
+        self.partitions = partitions
+        self.digests = [0] * partitions
+
+    def add(self, partition, binary):
+        pair_hash = int.from_bytes(blake2b(binary, digest_size=8).digest(), byteorder='little')
+        self.digests[partition] = (self.digests[partition] + pair_hash) & 0xFFFFFFFFFFFFFFFF
+
+    def differ(self, other):
+        return [partition for partition in range(0, self.partitions)
+                if self.digests[partition] != other.digests[partition]]
+
+    def save(self, path):
+        with open(path, 'w') as manifest:
+            dump({'partitions': self.partitions, 'digests': self.digests}, manifest)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as manifest:
+            data = load(manifest)
+        digests = cls(data['partitions'])
+        digests.digests = data['digests']
+        return digests
@@ -1,32 +1,100 @@
 #!/usr/bin/env python3
 
-from ignite.binary import BinaryObject
-from multiprocessing.dummy import Process, Pool as ThreadPool
-from socket import socket, AF_INET, SOCK_STREAM, error
+from ignite.bloom import KeyFilters
+from ignite.binary import BinaryCodec, BinaryObject, ComplexObject, java_string_hashcode
+from ignite.columnar import ColumnarDecoder, ColumnarEncoder
+from ignite.configuration import CacheConfiguration
+from ignite.hotkeys import HotKeyTracker
+from ignite.largeobject import LargeObjectStore
+from ignite.limiter import AIMDLimiter
+from ignite.singleflight import SingleFlight
+from ignite.snapshot import SnapshotReader, SnapshotWriter
+from ignite.sync import PartitionDigests, affinity_partition
+from ignite.throttle import ScanThrottle
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError, as_completed, wait
+from collections import deque
+from select import select
+from socket import socket, AF_INET, SOCK_STREAM, error, timeout as socket_timeout
 from struct import pack
-from threading import get_ident, Thread, active_count
-from queue import Queue
+from heapq import heapify, heappop, heappush
+from itertools import count
+from os import getpid
+from os.path import exists
+from threading import get_ident, Condition, Event, Lock, Thread, active_count
+from time import time
+from weakref import WeakSet
 
-
-def java_string_hashcode(s):
-    h = 0
-    for c in s:
-        h = (31 * h + ord(c)) & 0xFFFFFFFF
-    return ((h + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+try:
+    from os import register_at_fork
+except ImportError:
+    register_at_fork = None
 
 
 class ThinClientException(Exception):
     pass
 
 
+class ThinClientTimeoutException(ThinClientException):
+    pass
+
+
 class ThinClientPoolException(Exception):
     pass
 
 
+class ThinClientPoolOverloadException(ThinClientPoolException):
+    pass
+
+
+# The clients and the pools created in this process, they are reset in the child process after fork
+fork_instances = WeakSet()
+
+
+def reset_after_fork():
+    for instance in list(fork_instances):
+        instance.reset_after_fork()
+
+
+if register_at_fork is not None:
+    register_at_fork(after_in_child=reset_after_fork)
+
+
 class ThinClient:
 
     sock = None
 
+    # Number of recent latencies for the hedge percentile, the percentile is updated every hedge_min_samples
+    hedge_window = 1000
+    hedge_min_samples = 100
+
+    # Size of a single socket read
+    recv_buffer_size = 65536
+
+    # Sizes of the fixed size response fields
+    response_field_sizes = {
+        'bool': 1,
+        'flags': 1,
+        'success': 1,
+        'version_number_1': 2,
+        'version_number_2': 2,
+        'version_number_3': 2,
+        'cache_id': 4,
+        'status': 4,
+        'cursor_id': 8,
+        'long': 8,
+        'request_id': 8,
+    }
+
+    # Initial and maximal delay between reconnection attempts to a failed node, seconds
+    reconnect_backoff = 0.1
+    reconnect_backoff_max = 10
+
+    # Maximal number of keys sent in one batch request
+    keys_chunk_size = 10000
+
+    # Platforms of the scan query filters
+    filter_platforms = {'java': 1, 'dotnet': 2, 'cpp': 3}
+
     packet_formats = {
         'handshake.1.0.0': {
             'code': -1,
@@ -61,11 +129,15 @@ class ThinClient:
         },
         'OP_CACHE_GET': {
             'code': 1000,
+            'access': 'reads',
+            'idempotent': True,
+            'hedge': True,
             'request': ['op_code', 'request_id', 'cache_id', 'flags', 'binary_object_key'],
             'response': ['request_id', 'status', 'binary_object']
         },
         'OP_CACHE_PUT': {
             'code': 1001,
+            'access': 'writes',
             'request': ['op_code', 'request_id', 'cache_id', 'flags', 'binary_object_key', 'binary_object_value'],
             'response': ['request_id', 'status', 'routes'],
             'response_routes': {
@@ -75,8 +147,23 @@ class ThinClient:
                 }
             }
         },
+        'OP_CACHE_PUT_IF_ABSENT': {
+            'code': 1002,
+            'access': 'writes',
+            'request': ['op_code', 'request_id', 'cache_id', 'flags', 'binary_object_key', 'binary_object_value'],
+            'response': ['request_id', 'status', 'routes'],
+            'response_routes': {
+                'status': {
+                    0: ['bool'],
+                    -1: ['binary_object']
+                }
+            }
+        },
         'OP_CACHE_GET_ALL': {
             'code': 1003,
+            'access': 'reads',
+            'idempotent': True,
+            'hedge': True,
             'request': ['op_code', 'request_id', 'cache_id', 'flags', 'binary_object_count', 'binary_objects'],
             'response': ['request_id', 'status', 'routes'],
             'response_routes': {
@@ -88,6 +175,7 @@ class ThinClient:
         },
         'OP_CACHE_PUT_ALL': {
             'code': 1004,
+            'access': 'writes',
             'request': ['op_code', 'request_id', 'cache_id', 'flags', 'binary_object_count', 'binary_objects'],
             'response': ['request_id', 'status', 'routes'],
             'response_routes': {
@@ -97,8 +185,59 @@ class ThinClient:
                 }
             }
         },
+        'OP_CACHE_GET_AND_PUT': {
+            'code': 1005,
+            'access': 'writes',
+            'request': ['op_code', 'request_id', 'cache_id', 'flags', 'binary_object_key', 'binary_object_value'],
+            'response': ['request_id', 'status', 'binary_object']
+        },
+        'OP_CACHE_GET_AND_REPLACE': {
+            'code': 1006,
+            'access': 'writes',
+            'request': ['op_code', 'request_id', 'cache_id', 'flags', 'binary_object_key', 'binary_object_value'],
+            'response': ['request_id', 'status', 'binary_object']
+        },
+        'OP_CACHE_GET_AND_REMOVE': {
+            'code': 1007,
+            'access': 'writes',
+            'request': ['op_code', 'request_id', 'cache_id', 'flags', 'binary_object_key'],
+            'response': ['request_id', 'status', 'binary_object']
+        },
+        'OP_CACHE_GET_AND_PUT_IF_ABSENT': {
+            'code': 1008,
+            'access': 'writes',
+            'request': ['op_code', 'request_id', 'cache_id', 'flags', 'binary_object_key', 'binary_object_value'],
+            'response': ['request_id', 'status', 'binary_object']
+        },
+        'OP_CACHE_REPLACE': {
+            'code': 1009,
+            'access': 'writes',
+            'request': ['op_code', 'request_id', 'cache_id', 'flags', 'binary_object_key', 'binary_object_value'],
+            'response': ['request_id', 'status', 'routes'],
+            'response_routes': {
+                'status': {
+                    0: ['bool'],
+                    -1: ['binary_object']
+                }
+            }
+        },
+        'OP_CACHE_REPLACE_IF_EQUALS': {
+            'code': 1010,
+            'access': 'writes',
+            'request': ['op_code', 'request_id', 'cache_id', 'flags',
+                        'binary_object_key', 'binary_object_old_value', 'binary_object_value'],
+            'response': ['request_id', 'status', 'routes'],
+            'response_routes': {
+                'status': {
+                    0: ['bool'],
+                    -1: ['binary_object']
+                }
+            }
+        },
         'OP_CACHE_CONTAINS_KEY': {
             'code': 1011,
+            'access': 'reads',
+            'idempotent': True,
             'request': ['op_code', 'request_id', 'cache_id', 'flags', 'binary_object_key'],
             'response': ['request_id', 'status', 'routes'],
             'response_routes': {
@@ -110,6 +249,8 @@ class ThinClient:
         },
         'OP_CACHE_CONTAINS_KEYS': {
             'code': 1012,
+            'access': 'reads',
+            'idempotent': True,
             'request': ['op_code', 'request_id', 'cache_id', 'flags', 'binary_object_count', 'binary_objects'],
             'response': ['request_id', 'status', 'routes'],
             'response_routes': {
@@ -132,6 +273,7 @@ class ThinClient:
         },
         'OP_CACHE_CLEAR_KEY': {
             'code': 1014,
+            'access': 'writes',
             'request': ['op_code', 'request_id', 'cache_id', 'flags', 'binary_object_key'],
             'response': ['request_id', 'status', 'routes'],
             'response_routes': {
@@ -141,8 +283,21 @@ class ThinClient:
                 }
             }
         },
+        'OP_CACHE_CLEAR_KEYS': {
+            'code': 1015,
+            'access': 'writes',
+            'request': ['op_code', 'request_id', 'cache_id', 'flags', 'binary_object_count', 'binary_objects'],
+            'response': ['request_id', 'status', 'routes'],
+            'response_routes': {
+                'status': {
+                    0: [],
+                    -1: ['binary_object']
+                }
+            }
+        },
         'OP_CACHE_REMOVE_KEY': {
             'code': 1016,
+            'access': 'writes',
             'request': ['op_code', 'request_id', 'cache_id', 'flags', 'binary_object_key'],
             'response': ['request_id', 'status', 'routes'],
             'response_routes': {
@@ -152,6 +307,30 @@ class ThinClient:
                 }
             }
         },
+        'OP_CACHE_REMOVE_IF_EQUALS': {
+            'code': 1017,
+            'access': 'writes',
+            'request': ['op_code', 'request_id', 'cache_id', 'flags', 'binary_object_key', 'binary_object_value'],
+            'response': ['request_id', 'status', 'routes'],
+            'response_routes': {
+                'status': {
+                    0: ['bool'],
+                    -1: ['binary_object']
+                }
+            }
+        },
+        'OP_CACHE_REMOVE_KEYS': {
+            'code': 1018,
+            'access': 'writes',
+            'request': ['op_code', 'request_id', 'cache_id', 'flags', 'binary_object_count', 'binary_objects'],
+            'response': ['request_id', 'status', 'routes'],
+            'response_routes': {
+                'status': {
+                    0: [],
+                    -1: ['binary_object']
+                }
+            }
+        },
         'OP_CACHE_REMOVE_ALL': {
             'code': 1019,
             'request': ['op_code', 'request_id', 'cache_id', 'flags'],
@@ -165,6 +344,7 @@ class ThinClient:
         },
         'OP_CACHE_GET_SIZE': {
             'code': 1020,
+            'idempotent': True,
             'request': ['op_code', 'request_id', 'cache_id', 'flags', b'\x00\x00\x00\x00'],
             'response': ['request_id', 'status', 'routes'],
             'response_routes': {
@@ -176,6 +356,7 @@ class ThinClient:
         },
         'OP_CACHE_GET_NAMES': {
             'code': 1050,
+            'idempotent': True,
             'request': ['op_code', 'request_id'],
             'response': ['request_id', 'status', 'binary_object'],
         },
@@ -190,6 +371,41 @@ class ThinClient:
                 }
             }
         },
+        'OP_CACHE_CREATE_WITH_CONFIGURATION': {
+            'code': 1053,
+            'request': ['op_code', 'request_id', 'cache_configuration'],
+            'response': ['request_id', 'status', 'routes'],
+            'response_routes': {
+                'status': {
+                    0: [],
+                    -1: ['binary_object']
+                }
+            }
+        },
+        'OP_CACHE_GET_OR_CREATE_WITH_CONFIGURATION': {
+            'code': 1054,
+            'idempotent': True,
+            'request': ['op_code', 'request_id', 'cache_configuration'],
+            'response': ['request_id', 'status', 'routes'],
+            'response_routes': {
+                'status': {
+                    0: [],
+                    -1: ['binary_object']
+                }
+            }
+        },
+        'OP_CACHE_GET_CONFIGURATION': {
+            'code': 1055,
+            'idempotent': True,
+            'request': ['op_code', 'request_id', 'cache_id', 'flags'],
+            'response': ['request_id', 'status', 'routes'],
+            'response_routes': {
+                'status': {
+                    0: ['binary_object'],
+                    -1: ['binary_object']
+                }
+            }
+        },
         'OP_CACHE_DESTROY': {
             'code': 1056,
             'request': ['op_code', 'request_id', 'cache_id'],
@@ -201,10 +417,22 @@ class ThinClient:
                 }
             }
         },
+        'OP_REGISTER_BINARY_TYPE_NAME': {
+            'code': 3001,
+            'idempotent': True,
+            'request': ['op_code', 'request_id', 'platform_id', 'type_id', 'binary_object'],
+            'response': ['request_id', 'status', 'routes'],
+            'response_routes': {
+                'status': {
+                    0: [],
+                    -1: ['binary_object']
+                }
+            }
+        },
         'OP_SCAN_QUERY': {
             'code': 2000,
             'request': ['op_code', 'request_id', 'cache_id', 'flags',
-                        'binary_object', 'cursor_page_size', 'partition', 'is_local'],
+                        'binary_object', 'filter_platform', 'cursor_page_size', 'partition', 'is_local'],
             'response': ['request_id', 'status', 'cursor_id', 'routes'],
             'response_routes': {
                 'status': {
@@ -227,16 +455,67 @@ class ThinClient:
     }
 
     def __communicate(self, *args, **kwargs):
+        if self.pid != getpid():
+            self.reset_after_fork()
+        if self.forked:
+            # The handshake replaces the request
+            request = self.request
+            self.__reconnect_after_fork()
+            self.request = request
         try:
             self.__encode_request(*args)
             self.raw_response = None
-            self.sock.send(self.raw_request)
-            self.raw_response = self.sock.recv(4096)
+            operation = args[0]
+            request = self.request
+            raw_request = self.raw_request
+            access = self.packet_formats[operation].get('access')
+            if access == 'writes' and request.get('cache') in self.key_filters.options:
+                # The keys are added before sending, the write may be applied even if the response is lost
+                self.key_filters.add(request['cache'], self.__request_keys(request))
+            # The deadline covers both sending of the request and receiving of the response
+            timeout = self.request.get('timeout')
+            if timeout is None:
+                timeout = self.timeout
+            self.deadline = None
+            if timeout is not None:
+                self.deadline = time() + timeout
+            # The failover stopped by the deadline of the previous operation is completed now
+            if self.sock is None and not operation.startswith('handshake') and not self.__failover():
+                raise ThinClientException("Operation %s failed: no nodes are reachable" % operation)
+            attempt = 0
+            while True:
+                try:
+                    self.__send(raw_request, not operation.startswith('handshake'))
+                    if self.packet_formats[operation].get('hedge'):
+                        self.raw_response = self.__receive_hedged(raw_request)
+                    else:
+                        self.raw_response = self.__receive(not operation.startswith('handshake'))
+                    break
+                except socket_timeout:
+                    raise ThinClientTimeoutException("Operation %s timed out in %s s" % (operation, timeout))
+                except error:
+                    # The handshake is done on a connection which is not established yet
+                    if operation.startswith('handshake'):
+                        raise
+                    failed_over = self.__failover()
+                    if self.deadline is not None and time() >= self.deadline:
+                        raise ThinClientTimeoutException("Operation %s timed out in %s s" % (operation, timeout))
+                    # Only the requests which are safe to repeat are sent to a new connection
+                    if not failed_over or not self.packet_formats[operation].get('idempotent') \
+                            or attempt >= self.retries:
+                        raise
+                    attempt += 1
+                finally:
+                    # The reconnection replaces the request by the handshake one
+                    self.request = request
+                    self.raw_request = raw_request
             self.__decode_request(*args)
             if self.response.get('status') is not None:
                 if self.response['status'] != 0:
-                    err_msg = BinaryObject().load_bytes(self.response['binary_object']).deserialize()
+                    err_msg = BinaryObject(zero_copy=self.zero_copy).load_bytes(self.response['binary_object']).deserialize()
                     raise ThinClientException("Operation %s failed: %s" % (self.operation, err_msg))
+            if access is not None and self.hot_key_tracker is not None and self.hot_key_tracker.sampled():
+                self.__record_hot_keys(request, access)
         finally:
             self.request_id += 1
             if kwargs.get('debug') is True:
@@ -246,11 +525,108 @@ class ThinClient:
                 print("Raw response length: %s" % len(self.raw_response))
                 print("Decoded:      %s" % self.response)
 
+    @staticmethod
+    def __request_keys(request):
+        # The keys encoded by the caller are not known
+        if 'binary_object_key' in request:
+            return [request['binary_object_key']]
+        elif isinstance(request.get('binary_objects'), (list, dict)):
+            return list(request['binary_objects'])
+        return None
+
+    def __record_hot_keys(self, request, access):
+        keys = self.__request_keys(request) or []
+        size = len(self.raw_request)
+        if access == 'reads':
+            size = len(self.raw_response)
+        self.hot_key_tracker.record(request['cache'], keys, access, size)
+
+    def hot_keys(self, cache, count=10):
+        """
+        Get the hottest keys of the cache sampled by the hot key tracker.
+        :return:    The list of dictionaries with the key, the estimated number of operations, the estimated rates
+                    of reads and writes per second and the average payload size in bytes, the hottest keys first.
+        """
+        if self.hot_key_tracker is None:
+            raise ThinClientException("Hot keys are not tracked, use hot_keys option")
+        return self.hot_key_tracker.hot_keys(cache, count)
+
+    def __apply_deadline(self):
+        if self.deadline is None:
+            if self.sock.gettimeout() is not None:
+                self.sock.settimeout(None)
+        else:
+            remaining = self.deadline - time()
+            if remaining <= 0:
+                raise socket_timeout("timed out")
+            self.sock.settimeout(remaining)
+
+    def __send(self, raw_request, failover=True):
+        # Nothing is sent if the deadline has passed already, so the connection is kept
+        self.__apply_deadline()
+        try:
+            self.sock.sendall(raw_request)
+        except socket_timeout:
+            # The request could be sent partially, so the connection can't be used anymore
+            if failover:
+                self.__failover()
+            raise
+
+    def __receive_into(self, state):
+        buffer = state[0]
+        view = memoryview(buffer)
+        while state[1] < len(buffer):
+            self.__apply_deadline()
+            size = self.sock.recv_into(view[state[1]:], min(len(buffer) - state[1], self.recv_buffer_size))
+            if size == 0:
+                raise ConnectionResetError("Connection closed by %s:%s" % self.node)
+            state[1] += size
+
+    def __receive(self, check_id=True):
+        # Read the message length first and then exactly one message into a new buffer,
+        # the buffer is never reused since the zero copy values refer to it.
+        # The progress is kept on timeout, so the rest of the message is read by the next call
+        # and the responses of other requests, e.g. the timed out ones, are dropped.
+        # The handshake response has no request id, so it's not checked.
+        try:
+            while True:
+                if self.partial_response is None:
+                    self.partial_response = [bytearray(4), 0, True]
+                state = self.partial_response
+                self.__receive_into(state)
+                if state[2]:
+                    buffer = bytearray(4 + int.from_bytes(state[0], byteorder='little'))
+                    buffer[0:4] = state[0]
+                    state = self.partial_response = [buffer, 4, False]
+                    self.__receive_into(state)
+                self.partial_response = None
+                request_id = int.from_bytes(state[0][4:12], byteorder='little')
+                if check_id and request_id != self.request_id:
+                    self.timed_out_requests.discard(request_id)
+                    continue
+                return state[0]
+        except socket_timeout:
+            self.timed_out_requests.add(self.request_id)
+            raise
+
+    @staticmethod
+    def __encode_object(value, type_name=None):
+        """
+        :return:    The list of the encoded parts of the value to append to the message,
+                    byte arrays are the parts as they are without intermediate copies.
+        """
+        if isinstance(value, (bytes, bytearray, memoryview)) and type_name in [None, 'python.bytes', 'array.byte']:
+            # The length is of the bytes, not of the items of the typed buffers like array('q')
+            data = memoryview(value).cast('B')
+            return [b'\x0c' + data.nbytes.to_bytes(4, byteorder='little'), data]
+        return [BinaryObject().load_value(value).serialize(type=type_name)]
+
     def __encode_request(self, operation, mode=None):
         if not mode:
             mode = ''
         data = self.request
-        encoded = b''
+        # The message is built in place after the reserved length header, the big values are not copied again
+        encoded = bytearray(4)
         op_code = self.packet_formats[operation]['code']
         # Find the field attributes
         attrs = {}
@@ -268,15 +644,36 @@ class ThinClient:
                 if field == 'binary_object_count':
                     encoded += int(data['binary_object_count']).to_bytes(4, byteorder='little')
                 elif field == 'binary_objects':
+                    key_codec = attrs.get(field, {}).get('key_codec')
+                    value_codec = attrs.get(field, {}).get('value_codec')
                     if isinstance(data[field], list):
                         for obj in data[field]:
-                            encoded += BinaryObject().load_value(obj).serialize()
+                            if key_codec is not None:
+                                encoded += key_codec.encode(obj)
+                            else:
+                                encoded += BinaryObject().load_value(obj).serialize()
+                    elif isinstance(data[field], (bytes, bytearray, memoryview)):
+                        # The objects are encoded already
+                        encoded += data[field]
                     elif isinstance(data[field], dict):
                         for obj_key in data[field].keys():
-                            encoded += BinaryObject().load_value(obj_key).serialize() \
-                                       + BinaryObject().load_value(data[field][obj_key]).serialize()
+                            if key_codec is not None:
+                                encoded += key_codec.encode(obj_key)
+                            else:
+                                encoded += BinaryObject().load_value(obj_key).serialize()
+                            if value_codec is not None:
+                                encoded += value_codec.encode(data[field][obj_key])
+                            else:
+                                for part in self.__encode_object(data[field][obj_key]):
+                                    encoded += part
                 elif field.startswith('binary_object'):
-                    encoded += BinaryObject().load_value(data[field]).serialize(type=attrs[field].get('type'))
+                    if attrs[field].get('codec') is not None:
+                        encoded += attrs[field]['codec'].encode(data[field])
+                    else:
+                        for part in self.__encode_object(data[field], attrs[field].get('type')):
+                            encoded += part
+                elif field == 'cache_configuration':
+                    encoded += data[field].serialize_properties()
                 elif field == 'cache_id':
                     encoded += int(java_string_hashcode(data['cache'])).to_bytes(4, byteorder='little', signed=True)
                 elif field == 'flags':
@@ -291,7 +688,13 @@ class ThinClient:
                 elif field.startswith('version_number'):
                     encoded += data[field].to_bytes(2, byteorder='little')
                 elif field == 'filter_platform':
+                    # The platform follows the filter object only if there's a filter
+                    if data['binary_object'] is not None:
+                        encoded += data[field].to_bytes(1, byteorder='little')
+                elif field == 'platform_id':
                     encoded += data[field].to_bytes(1, byteorder='little')
+                elif field == 'type_id':
+                    encoded += data[field].to_bytes(4, byteorder='little', signed=True)
                 elif field == 'cursor_page_size':
                     encoded += data[field].to_bytes(4, byteorder='little')
                 elif field == 'partition':
@@ -301,13 +704,14 @@ class ThinClient:
                         encoded += b'\x01'
                     else:
                         encoded += b'\x00'
-        encoded = len(encoded).to_bytes(4, byteorder='little') + encoded
+        encoded[0:4] = (len(encoded) - 4).to_bytes(4, byteorder='little')
         self.raw_request = encoded
 
     def __decode_request(self, operation, mode=None):
         if not mode:
             mode = ''
-        data = self.raw_response
+        # All the fields are read by offsets in the same receive buffer
+        data = memoryview(self.raw_response)
         decoded = {}
         pos = 0
         msg_len = int.from_bytes(data[pos:pos+4], byteorder='little') + 4
@@ -328,15 +732,18 @@ class ThinClient:
                 val = 2*int.from_bytes(data[pos:pos + 4], byteorder='little')
                 pos += 4
             elif field == 'binary_object':
-                val = data[pos:]
-                if field_idx < (len(fields)-1):
+                next_fields = fields[field_idx+1:]
+                if all(next_field in self.response_field_sizes for next_field in next_fields):
+                    # The object takes the rest of message except the fixed size fields after it
+                    end_pos = msg_len
+                    for next_field in next_fields:
+                        end_pos -= self.response_field_sizes[next_field]
+                    val = data[pos:end_pos]
+                    pos = end_pos
+                else:
                     start_pos = pos
-                    if decoded.get('binary_object_count'):
-                        pos = BinaryObject().load_bytes(val).skip_entries(decoded['binary_object_count'], 0)
-                        pos += start_pos
-                        val = data[start_pos:pos]
-                    else:
-                        pos = msg_len-1
+                    pos = BinaryObject().load_bytes(data).skip_entries(decoded['binary_object_count'], pos)
+                    val = data[start_pos:pos]
             elif field == 'bool':
                 val = {0: False, 1: True}[int.from_bytes(data[pos:pos+1], byteorder='little')]
                 pos += 1
@@ -362,6 +769,64 @@ class ThinClient:
             field_idx += 1
         self.response = decoded
 
+    def __deserialize_response(self, **kwargs):
+        codec = kwargs.get('value_codec')
+        if codec is not None:
+            value, pos = codec.decode(self.response['binary_object'], 0)
+            return value
+        return BinaryObject(zero_copy=self.zero_copy).load_bytes(self.response['binary_object']).deserialize()
+
+    def __deserialize_pairs(self, response, **kwargs):
+        # Keys and values follow each other in the response or the scan page
+        key_codec = kwargs.get('key_codec')
+        value_codec = kwargs.get('value_codec')
+        binary = response['binary_object']
+        if key_codec is None and value_codec is None:
+            list_values = BinaryObject(zero_copy=self.zero_copy).load_bytes(binary).deserialize_entries(
+                response['binary_object_count']
+            )
+            pairs = {}
+            for key, value in zip(list_values[0::2], list_values[1::2]):
+                if isinstance(key, memoryview):
+                    # The views of the receive buffer are not hashable, the keys are copied
+                    key = key.tobytes()
+                pairs[key] = value
+            return pairs
+        bin_obj = BinaryObject(zero_copy=self.zero_copy)
+        pairs = {}
+        pos = 0
+        for item_idx in range(0, response['binary_object_count'], 2):
+            if key_codec is not None:
+                key, pos = key_codec.decode(binary, pos)
+            else:
+                key, pos = bin_obj.deserialize_entry(binary, pos, is_single_type=True)
+                if isinstance(key, memoryview):
+                    key = key.tobytes()
+            if value_codec is not None:
+                value, pos = value_codec.decode(binary, pos)
+            else:
+                value, pos = bin_obj.deserialize_entry(binary, pos, is_single_type=True)
+            pairs[key] = value
+        return pairs
+
+    def __communicate_chunked(self, operation, cache, keys, **kwargs):
+        # Split big key sets into several requests to keep every message bounded
+        chunk_size = kwargs.get('chunk_size')
+        if chunk_size is None:
+            chunk_size = self.keys_chunk_size
+        keys = list(keys)
+        for idx in range(0, len(keys), chunk_size):
+            chunk = keys[idx:idx+chunk_size]
+            self.request = {
+                'timeout': kwargs.get('timeout'),
+                'cache': cache,
+                'binary_objects': chunk,
+                'binary_objects.key_codec': kwargs.get('key_codec'),
+                'binary_object_count': len(chunk),
+            }
+            self.__communicate(operation)
+        return True
+
     def __init__(self, **kwargs):
         # Set protocol version
         self.host = '127.0.0.1'
@@ -388,22 +853,85 @@ class ThinClient:
             self.request_id -= 2**32
         self.request_id += 2**32
         self.bin_obj = None
+        self.kwargs = kwargs
+        # Return memoryview slices of the receive buffer for byte arrays instead of copies
+        self.zero_copy = kwargs.get('zero_copy', False)
+        # Endpoints for failover, the first reachable one is used as a primary node
+        self.nodes = [(self.host, self.port)]
+        if kwargs.get('nodes'):
+            self.nodes = [tuple(node) for node in kwargs.get('nodes')]
+        self.node = None
+        # Number of handshaked connections to other nodes kept for immediate failover
+        self.standby = kwargs.get('standby', 0)
+        # Number of times an idempotent request is repeated on a new connection
+        self.retries = kwargs.get('retries', 3)
+        self.standby_socks = []
+        self.standby_lock = Lock()
+        self.standby_wakeup = Event()
+        self.standby_thread = None
+        self.node_backoff = {}
+        # Default timeout of operations in seconds, None to wait infinitely
+        self.timeout = kwargs.get('timeout')
+        self.deadline = None
+        # The partially received response and the requests which responses are dropped after timeout
+        self.partial_response = None
+        self.timed_out_requests = set()
+        # Hedged reads: the request is repeated on the second connection if there is no response in hedge_delay
+        # seconds or in the hedge_percentile of the recent latencies
+        self.hedge_delay = kwargs.get('hedge_delay')
+        self.hedge_percentile = kwargs.get('hedge_percentile')
+        self.hedge = None
+        self.latencies = deque(maxlen=self.hedge_window)
+        self.latency_percentile = None
+        # Sampled statistics of the hottest keys: True or HotKeyTracker shared by several clients, e.g. of a pool
+        self.hot_key_tracker = kwargs.get('hot_keys')
+        if self.hot_key_tracker is True:
+            self.hot_key_tracker = HotKeyTracker()
+        elif self.hot_key_tracker is False:
+            self.hot_key_tracker = None
+        # Collapsing of concurrent identical reads: True or SingleFlight shared by the clients of several threads
+        self.single_flight = kwargs.get('collapse')
+        if self.single_flight is True:
+            self.single_flight = SingleFlight()
+        elif self.single_flight is False:
+            self.single_flight = None
+        # Bloom filters of the cache keys, KeyFilters may be shared by several clients, e.g. of a pool.
+        # The clients created by this one share them too, so their writes are added to the filters
+        self.key_filters = kwargs.get('key_filters')
+        if not isinstance(self.key_filters, KeyFilters):
+            self.key_filters = KeyFilters()
+            self.kwargs['key_filters'] = self.key_filters
+        # Type ids of the classes which names are registered in the cluster
+        self.registered_types = set()
+        # The connections inherited by a child process are dropped and the client reconnects on the next operation,
+        # or right after fork with fork_prewarm
+        self.pid = getpid()
+        self.fork_prewarm = kwargs.get('fork_prewarm', False)
+        self.forked = False
+        fork_instances.add(self)
 
     def __del__(self):
         if self.sock is not None:
             self.sock.close()
+        for node, sock in self.standby_socks:
+            sock.close()
 
-    def connect(self, addr_port=None):
+    def __handshake(self, addr_port, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
         self.sock = socket(AF_INET, SOCK_STREAM)
+        self.node = addr_port
+        self.partial_response = None
+        self.timed_out_requests = set()
         try:
-            if addr_port is None:
-                addr_port = (self.host, self.port)
+            self.sock.settimeout(timeout)
             self.sock.connect(addr_port)
             operation = 'handshake'
             version_text = '%s.%s.%s' % (self.version[0], self.version[1], self.version[2])
             if self.packet_formats.get('handshake.%s' % version_text):
                 self.operation = 'handshake.%s' % version_text
             self.request = {
+                'timeout': timeout,
                 'version_number_1': self.version[0],
                 'version_number_2': self.version[1],
                 'version_number_3': self.version[2],
@@ -417,89 +945,542 @@ class ThinClient:
                 mode = '.auth'
             self.__communicate(operation, mode)
             if self.response['success'] != 1:
-                err_msg = BinaryObject().load_bytes(self.response['binary_object']).deserialize()
+                err_msg = BinaryObject(zero_copy=self.zero_copy).load_bytes(self.response['binary_object']).deserialize()
                 raise ThinClientException("Connection failed: %s" % err_msg)
-        except error as e:
-            print("something went wrong %s" % str(e))
-            raise e
+        except BaseException:
+            self.sock.close()
+            self.sock = None
+            self.node = None
+            raise
+
+    def __open_standby(self, addr_port):
+        # Handshake is made by a separate client to keep the state of this one intact
+        thin = ThinClient(**self.kwargs)
+        thin.__handshake(addr_port)
+        sock = thin.sock
+        thin.sock = None
+        return sock
+
+    def __maintain_standby(self):
+        while self.standby_thread is not None:
+            wait = self.reconnect_backoff_max
+            for node in self.nodes:
+                with self.standby_lock:
+                    busy_nodes = [standby_node for standby_node, sock in self.standby_socks]
+                    if len(busy_nodes) >= self.standby:
+                        break
+                    if node == self.node or node in busy_nodes:
+                        continue
+                    delay, next_try = self.node_backoff.get(node, (self.reconnect_backoff, 0))
+                if time() < next_try:
+                    wait = min(wait, next_try - time())
+                    continue
+                try:
+                    sock = self.__open_standby(node)
+                    with self.standby_lock:
+                        self.node_backoff.pop(node, None)
+                        self.standby_socks.append((node, sock))
+                except (error, ThinClientException):
+                    # Exponential backoff for the nodes which are still down
+                    with self.standby_lock:
+                        self.node_backoff[node] = (min(2*delay, self.reconnect_backoff_max), time() + delay)
+                    wait = min(wait, delay)
+            self.standby_wakeup.wait(wait)
+            self.standby_wakeup.clear()
+
+    def __hedge_delay(self):
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        if self.hedge_percentile is None or len(self.latencies) < self.hedge_min_samples:
+            return None
+        if self.latency_percentile is None or len(self.latencies) % self.hedge_min_samples == 0:
+            latencies = sorted(self.latencies)
+            self.latency_percentile = latencies[min(len(latencies) - 1, int(self.hedge_percentile * len(latencies)))]
+        return self.latency_percentile
+
+    def __hedge_connection(self):
+        if self.hedge is None or self.hedge.sock is None:
+            self.hedge = None
+            # Another node is preferred for the second connection
+            nodes = [node for node in self.nodes if node != self.node] + [self.node]
+            for node in nodes:
+                hedge = ThinClient(**self.kwargs)
+                hedge.nodes = self.nodes
+                try:
+                    hedge.__handshake(node)
+                    self.hedge = hedge
+                    break
+                except (error, ThinClientException):
+                    pass
+        return self.hedge
+
+    def __receive_hedged(self, raw_request):
+        start = time()
+        wait = self.__hedge_delay()
+        if wait is not None and self.deadline is not None:
+            wait = max(0, min(wait, self.deadline - start))
+        if wait is None or self.partial_response is not None or len(select([self.sock], [], [], wait)[0]) > 0:
+            response = self.__receive()
+        elif self.__hedge_connection() is None:
+            response = self.__receive()
+        else:
+            hedge = self.hedge
+            hedge.deadline = self.deadline
+            try:
+                hedge.__send(raw_request, False)
+            except error:
+                self.hedge = None
+                hedge.disconnect()
+                return self.__receive()
+            remaining = None
+            if self.deadline is not None:
+                remaining = max(0, self.deadline - time())
+            readable = select([self.sock, hedge.sock], [], [], remaining)[0]
+            if len(readable) == 0:
+                self.timed_out_requests.add(self.request_id)
+                hedge.timed_out_requests.add(self.request_id)
+                raise socket_timeout("timed out")
+            # The response of the slower connection is dropped when it comes
+            if self.sock in readable:
+                hedge.timed_out_requests.add(self.request_id)
+                response = self.__receive()
+            else:
+                self.timed_out_requests.add(self.request_id)
+                hedge.request_id = self.request_id
+                try:
+                    response = hedge.__receive()
+                except socket_timeout:
+                    raise
+                except error:
+                    self.hedge = None
+                    hedge.disconnect()
+                    raise socket_timeout("timed out")
+        self.latencies.append(time() - start)
+        return response
+
+    def __failover(self):
+        # The handshake replaces the deadline and the request id of the operation in progress
+        deadline = self.deadline
+        request_id = self.request_id
+        try:
+            return self.__reconnect(deadline)
+        finally:
+            self.deadline = deadline
+            self.request_id = request_id
+
+    def __reconnect(self, deadline):
+        failed_node = self.node
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        self.node = None
+        self.partial_response = None
+        self.timed_out_requests = set()
+        # Use a warm standby connection first
+        with self.standby_lock:
+            if failed_node is not None:
+                self.node_backoff[failed_node] = (self.reconnect_backoff, time() + self.reconnect_backoff)
+            if len(self.standby_socks) > 0:
+                self.node, self.sock = self.standby_socks.pop(0)
+        self.standby_wakeup.set()
+        if self.sock is not None:
+            return True
+        # Otherwise try to connect synchronously, the failed node goes last
+        nodes = [node for node in self.nodes if node != failed_node]
+        if failed_node in self.nodes:
+            nodes.append(failed_node)
+        for node in nodes:
+            # The connection is limited by the time left to the operation
+            timeout = self.timeout
+            if deadline is not None:
+                timeout = deadline - time()
+                if timeout <= 0:
+                    break
+                if self.timeout is not None:
+                    timeout = min(timeout, self.timeout)
+            try:
+                self.__handshake(node, timeout)
+                return True
+            except (error, ThinClientException):
+                pass
+        return False
+
+    def connect(self, addr_port=None):
+        """
+        Connect to the first reachable node.
+        :param      addr_port:  The (host, port) tuple or the list of such tuples for failover.
+                                The nodes passed to the constructor in `nodes` are used by default.
+        """
+        if isinstance(addr_port, list):
+            self.nodes = [tuple(node) for node in addr_port]
+        elif addr_port is not None:
+            self.nodes = [addr_port]
+        last_error = None
+        for node in self.nodes:
+            try:
+                self.__handshake(node)
+                break
+            except (error, ThinClientTimeoutException) as e:
+                # The node which accepts the connection but does not answer the handshake is skipped too
+                last_error = e
+        if self.sock is None:
+            if last_error is None:
+                raise ThinClientException("No nodes to connect to")
+            print("something went wrong %s" % str(last_error))
+            raise last_error
+        if self.hedge_delay is not None or self.hedge_percentile is not None:
+            self.__hedge_connection()
+        if self.standby > 0 and len(self.nodes) > 1 and self.standby_thread is None:
+            self.standby_thread = Thread(target=self.__maintain_standby, daemon=True)
+            self.standby_thread.start()
+
+    def reset_after_fork(self):
+        """
+        Drop the connections inherited from the parent process. The sockets are closed in this process only,
+        the parent process keeps using them. Called automatically in the child process after fork.
+        """
+        if self.pid == getpid():
+            return
+        self.pid = getpid()
+        connected = self.sock is not None
+        # The threads are not inherited and the locks may be held by them
+        self.standby_thread = None
+        self.standby_lock = Lock()
+        self.standby_wakeup = Event()
+        for node, sock in self.standby_socks:
+            sock.close()
+        self.standby_socks = []
+        # The hedge client is reset by itself
+        self.hedge = None
+        if self.hot_key_tracker is not None:
+            self.hot_key_tracker.lock = Lock()
+        if self.single_flight is not None:
+            self.single_flight.reset()
+        self.key_filters.reset_after_fork()
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        self.partial_response = None
+        self.timed_out_requests = set()
+        self.forked = connected
+        if self.forked and self.fork_prewarm:
+            try:
+                self.__reconnect_after_fork()
+            except error:
+                # Reconnect on the next operation
+                self.forked = True
+
+    def __reconnect_after_fork(self):
+        self.forked = False
+        node = self.node
+        if node in self.nodes:
+            # Reconnect to the same node first
+            self.nodes.remove(node)
+            self.nodes.insert(0, node)
+        self.connect()
 
     def disconnect(self):
-        self.sock.close()
+        self.forked = False
+        if self.standby_thread is not None:
+            self.standby_thread = None
+            self.standby_wakeup.set()
+        with self.standby_lock:
+            for node, sock in self.standby_socks:
+                sock.close()
+            self.standby_socks = []
+        if self.hedge is not None:
+            self.hedge.disconnect()
+            self.hedge = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def build_key_filter(self, cache, **kwargs):
+        """
+        Build the Bloom filter of the cache keys by the key scan of the cache. cache_get, cache_get_all,
+        cache_contains_key and cache_contains_keys answer the keys which are not in the filter without requests.
+        The filter is updated by the writes of the clients sharing it and rebuilt in background periodically.
+        :param      cache:  The cache name.
+                    kwargs: false_positive_rate, rebuild_interval and headroom, see KeyFilters.enable.
+        """
+        self.key_filters.enable(cache, **kwargs)
+        self.key_filters.build(self, cache, self.key_filters.claim(cache, force=True))
+
+    def drop_key_filter(self, cache):
+        self.key_filters.disable(cache)
+
+    def __build_key_filter(self, cache, options):
+        # The scan runs on its own connection, this one is used by the caller
+        builder = ThinClient(**self.kwargs)
+        try:
+            builder.connect(self.node)
+        except (error, ThinClientException):
+            self.key_filters.cancel(options)
+            return
+        try:
+            self.key_filters.build(builder, cache, options)
+        except (error, ThinClientException):
+            # The build is repeated later, the lookups go to the cluster meanwhile
+            pass
+        finally:
+            builder.disconnect()
+
+    def __present_keys(self, cache, keys, **kwargs):
+        if cache not in self.key_filters.options:
+            return keys
+        if self.key_filters.due(cache):
+            options = self.key_filters.claim(cache)
+            if options is not None:
+                Thread(target=self.__build_key_filter, args=(cache, options), daemon=True).start()
+        # The keys encoded by the codec or of the given types are not filtered, the filter has the decoded keys
+        if kwargs.get('key_codec') is not None or kwargs.get('key_type') is not None:
+            return keys
+        return self.key_filters.present(cache, keys)
+
+    def __collapse(self, operation, method, cache, keys, **kwargs):
+        # The zero copy results are the views of the receive buffer of the client which made the request
+        flight_key = None
+        if self.single_flight is not None and not self.zero_copy:
+            options = {name: value for name, value in kwargs.items() if name != 'timeout'}
+            if operation == 'OP_CACHE_GET_ALL':
+                flight_key = SingleFlight.key(operation, cache, key_set=keys, **options)
+            else:
+                flight_key = SingleFlight.key(operation, cache, keys, **options)
+        if flight_key is None:
+            return method(cache, keys, **kwargs)
+        timeout = kwargs.get('timeout', self.timeout)
+        try:
+            # The caller waits for its own timeout, the timeout of another caller is not shared
+            return self.single_flight.do(flight_key, lambda: method(cache, keys, **kwargs), timeout,
+                                         retry=ThinClientTimeoutException)
+        except FutureTimeoutError:
+            raise ThinClientTimeoutException("Operation %s timed out in %s s" % (operation, timeout))
 
     def cache_get(self, cache, key, **kwargs):
+        if len(self.__present_keys(cache, [key], **kwargs)) == 0:
+            return None
+        return self.__collapse('OP_CACHE_GET', self.__cache_get, cache, key, **kwargs)
+
+    def __cache_get(self, cache, key, **kwargs):
         self.request = {
+            'timeout': kwargs.get('timeout'),
             'cache': cache,
             'binary_object_key': key,
-            'binary_object_key.type': kwargs.get('key_type')
+            'binary_object_key.type': kwargs.get('key_type'),
+            'binary_object_key.codec': kwargs.get('key_codec'),
         }
         self.__communicate('OP_CACHE_GET')
-        return BinaryObject().load_bytes(self.response['binary_object']).deserialize()
+        return self.__deserialize_response(**kwargs)
 
     def cache_get_binary_object(self, cache, key, **kwargs):
         self.request = {
+            'timeout': kwargs.get('timeout'),
             'cache': cache,
             'binary_object_key': key,
-            'binary_object_key.type': kwargs.get('key_type')
+            'binary_object_key.type': kwargs.get('key_type'),
+            'binary_object_key.codec': kwargs.get('key_codec'),
         }
         self.__communicate('OP_CACHE_GET')
-        return BinaryObject().load_bytes(self.response['binary_object'])
+        raw_bytes = self.response['binary_object']
+        if not self.zero_copy:
+            raw_bytes = bytes(raw_bytes)
+        return BinaryObject(zero_copy=self.zero_copy).load_bytes(raw_bytes)
 
     def cache_put(self, cache, key, val, **kwargs):
         self.request = {
+            'timeout': kwargs.get('timeout'),
             'cache': cache,
             'binary_object_key': key,
             'binary_object_key.type': kwargs.get('key_type'),
+            'binary_object_key.codec': kwargs.get('key_codec'),
             'binary_object_value': val,
             'binary_object_value.type': kwargs.get('value_type'),
+            'binary_object_value.codec': kwargs.get('value_codec'),
         }
         self.__communicate('OP_CACHE_PUT')
         return self.response['status'] == 0
 
+    def cache_put_if_absent(self, cache, key, val, **kwargs):
+        self.request = {
+            'timeout': kwargs.get('timeout'),
+            'cache': cache,
+            'binary_object_key': key,
+            'binary_object_key.type': kwargs.get('key_type'),
+            'binary_object_key.codec': kwargs.get('key_codec'),
+            'binary_object_value': val,
+            'binary_object_value.type': kwargs.get('value_type'),
+            'binary_object_value.codec': kwargs.get('value_codec'),
+        }
+        self.__communicate('OP_CACHE_PUT_IF_ABSENT')
+        return self.response['bool'] == 1
+
+    def cache_get_and_put(self, cache, key, val, **kwargs):
+        self.request = {
+            'timeout': kwargs.get('timeout'),
+            'cache': cache,
+            'binary_object_key': key,
+            'binary_object_key.type': kwargs.get('key_type'),
+            'binary_object_key.codec': kwargs.get('key_codec'),
+            'binary_object_value': val,
+            'binary_object_value.type': kwargs.get('value_type'),
+            'binary_object_value.codec': kwargs.get('value_codec'),
+        }
+        self.__communicate('OP_CACHE_GET_AND_PUT')
+        return self.__deserialize_response(**kwargs)
+
+    def cache_get_and_replace(self, cache, key, val, **kwargs):
+        self.request = {
+            'timeout': kwargs.get('timeout'),
+            'cache': cache,
+            'binary_object_key': key,
+            'binary_object_key.type': kwargs.get('key_type'),
+            'binary_object_key.codec': kwargs.get('key_codec'),
+            'binary_object_value': val,
+            'binary_object_value.type': kwargs.get('value_type'),
+            'binary_object_value.codec': kwargs.get('value_codec'),
+        }
+        self.__communicate('OP_CACHE_GET_AND_REPLACE')
+        return self.__deserialize_response(**kwargs)
+
+    def cache_get_and_remove(self, cache, key, **kwargs):
+        self.request = {
+            'timeout': kwargs.get('timeout'),
+            'cache': cache,
+            'binary_object_key': key,
+            'binary_object_key.type': kwargs.get('key_type'),
+            'binary_object_key.codec': kwargs.get('key_codec'),
+        }
+        self.__communicate('OP_CACHE_GET_AND_REMOVE')
+        return self.__deserialize_response(**kwargs)
+
+    def cache_get_and_put_if_absent(self, cache, key, val, **kwargs):
+        self.request = {
+            'timeout': kwargs.get('timeout'),
+            'cache': cache,
+            'binary_object_key': key,
+            'binary_object_key.type': kwargs.get('key_type'),
+            'binary_object_key.codec': kwargs.get('key_codec'),
+            'binary_object_value': val,
+            'binary_object_value.type': kwargs.get('value_type'),
+            'binary_object_value.codec': kwargs.get('value_codec'),
+        }
+        self.__communicate('OP_CACHE_GET_AND_PUT_IF_ABSENT')
+        return self.__deserialize_response(**kwargs)
+
+    def cache_replace(self, cache, key, val, **kwargs):
+        self.request = {
+            'timeout': kwargs.get('timeout'),
+            'cache': cache,
+            'binary_object_key': key,
+            'binary_object_key.type': kwargs.get('key_type'),
+            'binary_object_key.codec': kwargs.get('key_codec'),
+            'binary_object_value': val,
+            'binary_object_value.type': kwargs.get('value_type'),
+            'binary_object_value.codec': kwargs.get('value_codec'),
+        }
+        self.__communicate('OP_CACHE_REPLACE')
+        return self.response['bool'] == 1
+
+    def cache_replace_if_equals(self, cache, key, old_val, new_val, **kwargs):
+        self.request = {
+            'timeout': kwargs.get('timeout'),
+            'cache': cache,
+            'binary_object_key': key,
+            'binary_object_key.type': kwargs.get('key_type'),
+            'binary_object_key.codec': kwargs.get('key_codec'),
+            'binary_object_old_value': old_val,
+            'binary_object_old_value.type': kwargs.get('value_type'),
+            'binary_object_old_value.codec': kwargs.get('value_codec'),
+            'binary_object_value': new_val,
+            'binary_object_value.type': kwargs.get('value_type'),
+            'binary_object_value.codec': kwargs.get('value_codec'),
+        }
+        self.__communicate('OP_CACHE_REPLACE_IF_EQUALS')
+        return self.response['bool'] == 1
+
     def cache_get_all(self, cache, keys, **kwargs):
+        keys = self.__present_keys(cache, keys, **kwargs)
+        if len(keys) == 0:
+            return {}
+        result = self.__collapse('OP_CACHE_GET_ALL', self.__cache_get_all, cache, keys, **kwargs)
+        if self.single_flight is not None:
+            # The callers may change their results
+            result = dict(result)
+        return result
+
+    def __cache_get_all(self, cache, keys, **kwargs):
         self.request = {
+            'timeout': kwargs.get('timeout'),
             'cache': cache,
             'binary_objects': keys,
+            'binary_objects.key_codec': kwargs.get('key_codec'),
             'binary_object_count': len(keys),
         }
         self.__communicate('OP_CACHE_GET_ALL')
-        doubled_len = int(self.response['binary_object_count']).to_bytes(4, byteorder='little')
-        list_values = BinaryObject().load_bytes(
-            b'\x17\x00\x00\x00\x00' + doubled_len + self.response['binary_object']
-        ).deserialize()
-        value = {}
-        for item_idx in range(0, len(list_values), 2):
-            value[list_values[item_idx]] = list_values[item_idx+1]
-        return value
+        return self.__deserialize_pairs(self.response, **kwargs)
 
     def cache_put_all(self, cache, data, **kwargs):
         self.request = {
+            'timeout': kwargs.get('timeout'),
             'cache': cache,
             'binary_objects': data,
+            'binary_objects.key_codec': kwargs.get('key_codec'),
+            'binary_objects.value_codec': kwargs.get('value_codec'),
             'binary_object_count': len(data),
         }
         self.__communicate('OP_CACHE_PUT_ALL')
         return self.response['status'] == 0
 
+    def cache_put_all_arrays(self, cache, keys, values, **kwargs):
+        """
+        Put the entries of the key and value columns of primitive types, e.g. int64 keys and float64 values.
+        The columns are encoded into put all requests as whole arrays, without python objects for the entries.
+        :param      cache:  The cache name.
+                    keys:   The numpy array of the keys, or the python array if numpy is not installed.
+                    values: The array of the values of the same length.
+                    kwargs: page_bytes - the maximal size of the entries of one request, 4 MB by default.
+        :return:    The number of the entries put.
+        """
+        encoder = ColumnarEncoder(keys, values)
+        for binary, rows in encoder.pages(kwargs.get('page_bytes', 4 * 1024 * 1024)):
+            self.request = {
+                'timeout': kwargs.get('timeout'),
+                'cache': cache,
+                'binary_objects': binary,
+                'binary_object_count': rows,
+            }
+            self.__communicate('OP_CACHE_PUT_ALL')
+        return encoder.rows
+
     def cache_contains_key(self, cache, key, **kwargs):
+        if len(self.__present_keys(cache, [key], **kwargs)) == 0:
+            return False
         self.request = {
+            'timeout': kwargs.get('timeout'),
             'cache': cache,
             'binary_object_key': key,
             'binary_object_key.type': kwargs.get('key_type'),
+            'binary_object_key.codec': kwargs.get('key_codec'),
         }
         self.__communicate('OP_CACHE_CONTAINS_KEY')
         return self.response['bool'] == 1
 
     def cache_contains_keys(self, cache, keys, **kwargs):
+        if len(self.__present_keys(cache, keys, **kwargs)) < len(keys):
+            return False
         self.request = {
+            'timeout': kwargs.get('timeout'),
             'cache': cache,
             'binary_objects': keys,
+            'binary_objects.key_codec': kwargs.get('key_codec'),
             'binary_object_count': len(keys),
         }
         self.__communicate('OP_CACHE_CONTAINS_KEYS')
         return self.response['bool'] == 1
 
-    def cache_clear(self, cache):
+    def cache_clear(self, cache, **kwargs):
         self.request = {
+            'timeout': kwargs.get('timeout'),
             'cache': cache
         }
         self.__communicate('OP_CACHE_CLEAR')
@@ -507,123 +1488,925 @@ class ThinClient:
 
     def cache_clear_key(self, cache, key, **kwargs):
         self.request = {
+            'timeout': kwargs.get('timeout'),
             'cache': cache,
             'binary_object_key': key,
             'binary_object_key.type': kwargs.get('key_type'),
+            'binary_object_key.codec': kwargs.get('key_codec'),
         }
         self.__communicate('OP_CACHE_CLEAR_KEY')
 
+    def cache_clear_keys(self, cache, keys, **kwargs):
+        return self.__communicate_chunked('OP_CACHE_CLEAR_KEYS', cache, keys, **kwargs)
+
     def cache_remove_key(self, cache, key, **kwargs):
         self.request = {
+            'timeout': kwargs.get('timeout'),
             'cache': cache,
             'binary_object_key': key,
             'binary_object_key.type': kwargs.get('key_type'),
+            'binary_object_key.codec': kwargs.get('key_codec'),
         }
         self.__communicate('OP_CACHE_REMOVE_KEY')
         return self.response['bool'] == 1
 
-    def cache_remove_all(self, cache):
+    def cache_remove_if_equals(self, cache, key, val, **kwargs):
+        self.request = {
+            'timeout': kwargs.get('timeout'),
+            'cache': cache,
+            'binary_object_key': key,
+            'binary_object_key.type': kwargs.get('key_type'),
+            'binary_object_key.codec': kwargs.get('key_codec'),
+            'binary_object_value': val,
+            'binary_object_value.type': kwargs.get('value_type'),
+            'binary_object_value.codec': kwargs.get('value_codec'),
+        }
+        self.__communicate('OP_CACHE_REMOVE_IF_EQUALS')
+        return self.response['bool'] == 1
+
+    def cache_remove_keys(self, cache, keys, **kwargs):
+        return self.__communicate_chunked('OP_CACHE_REMOVE_KEYS', cache, keys, **kwargs)
+
+    def cache_remove_all(self, cache, **kwargs):
         self.request = {
+            'timeout': kwargs.get('timeout'),
             'cache': cache
         }
         self.__communicate('OP_CACHE_REMOVE_ALL')
 
-    def cache_get_size(self, cache):
+    def cache_get_size(self, cache, **kwargs):
         self.request = {
+            'timeout': kwargs.get('timeout'),
             'cache': cache,
             'flags': 0
         }
         self.__communicate('OP_CACHE_GET_SIZE')
         return self.response['long']
 
-    def cache_destroy(self, cache):
+    def cache_destroy(self, cache, **kwargs):
         self.request = {
+            'timeout': kwargs.get('timeout'),
             'cache': cache
         }
         self.__communicate('OP_CACHE_DESTROY')
 
-    def cache_create_with_name(self, cache):
+    def cache_create_with_name(self, cache, **kwargs):
         self.request = {
+            'timeout': kwargs.get('timeout'),
             'binary_object': cache,
             'binary_object.type': 'python.str',
         }
         self.__communicate('OP_CACHE_CREATE_WITH_NAME')
 
-    def cache_get_names(self):
-        self.request = {}
+    def cache_create_with_configuration(self, configuration, **kwargs):
+        """
+        Create the cache with the configuration in one request.
+        :param      configuration:  The CacheConfiguration instance.
+        """
+        self.request = {
+            'timeout': kwargs.get('timeout'),
+            'cache_configuration': configuration,
+        }
+        self.__communicate('OP_CACHE_CREATE_WITH_CONFIGURATION')
+
+    def cache_get_or_create_with_configuration(self, configuration, **kwargs):
+        """
+        Create the cache with the configuration if it does not exist, the existing cache is not changed.
+        :param      configuration:  The CacheConfiguration instance.
+        """
+        self.request = {
+            'timeout': kwargs.get('timeout'),
+            'cache_configuration': configuration,
+        }
+        self.__communicate('OP_CACHE_GET_OR_CREATE_WITH_CONFIGURATION')
+
+    def cache_get_configuration(self, cache, **kwargs):
+        """
+        Get the cache configuration, the query entities are not decoded.
+        :return:    The CacheConfiguration instance.
+        """
+        self.request = {
+            'timeout': kwargs.get('timeout'),
+            'cache': cache,
+            'flags': 0
+        }
+        self.__communicate('OP_CACHE_GET_CONFIGURATION')
+        return CacheConfiguration.deserialize(self.response['binary_object'])
+
+    def cache_get_names(self, **kwargs):
+        self.request = {
+            'timeout': kwargs.get('timeout'),
+        }
         self.__communicate('OP_CACHE_GET_NAMES')
         return sorted(BinaryObject().load_bytes(b'\x14'+self.response['binary_object']).deserialize())
 
-    def scan_query(self, cache, **kwargs):
+    def register_type_name(self, obj, **kwargs):
+        """
+        Register the class name of the complex object so the server resolves the type id of the object.
+        The name is registered once per client.
+        """
+        if obj.type_id in self.registered_types:
+            return
+        self.request = {
+            'timeout': kwargs.get('timeout'),
+            'platform_id': 0,
+            'type_id': obj.type_id,
+            'binary_object': obj.class_name,
+            'binary_object.type': 'python.str',
+        }
+        self.__communicate('OP_REGISTER_BINARY_TYPE_NAME')
+        self.registered_types.add(obj.type_id)
+
+    def __scan_pages(self, cache, **kwargs):
         options = {
             'cursor_page_size': 1000,
             'partition': -1,
-            'is_local': False
+            'is_local': False,
+            'filter': None,
+            'filter_platform': 'java'
         }
         for key in kwargs.keys():
             options[key] = kwargs[key]
+        scan_filter = options['filter']
+        if isinstance(scan_filter, ComplexObject) and scan_filter.class_name is not None:
+            self.register_type_name(scan_filter, **kwargs)
         self.request = {
+            'timeout': kwargs.get('timeout'),
             'cache': cache,
-            'binary_object': None,
-            'binary_object.type': 'python.NoneType',
+            'binary_object': scan_filter,
+            'binary_object.type': None,
+            'filter_platform': self.filter_platforms.get(options['filter_platform'], options['filter_platform']),
             'cursor_page_size': options['cursor_page_size'],
             'partition': options['partition'],
             'is_local': options['is_local']
         }
         self.__communicate('OP_SCAN_QUERY')
-        entries = {}
         go_next = True
         cursor_id = None
         while go_next:
             if cursor_id is not None:
                 self.request = {
+                    'timeout': kwargs.get('timeout'),
                     'cursor_id': cursor_id,
                 }
                 self.__communicate('OP_QUERY_SCAN_CURSOR_GET_PAGE')
             else:
                 cursor_id = self.response['cursor_id']
-            entry_cnt = int(self.response['binary_object_count']).to_bytes(4, byteorder='little')
-            list_values = BinaryObject().load_bytes(
-                b'\x17\x00\x00\x00\x00' + entry_cnt + self.response['binary_object']
-            ).deserialize()
-            for i in range(0, self.response['binary_object_count'], 2):
-                entries[list_values[i]] = list_values[i+1]
-            go_next = self.response['bool']
+            # Other requests may be sent on the connection before the next page
+            page = self.response
+            yield page
+            go_next = page['bool']
+
+    def scan_query(self, cache, **kwargs):
+        """
+        Scan the cache entries.
+        :param      cache:  The cache name.
+                    kwargs: cursor_page_size, partition, is_local - the scan options.
+                            filter - the predicate of entries executed by the server nodes,
+                            a ComplexObject of the class available on the server nodes with its arguments as fields.
+                            filter_platform - the platform of the filter class: 'java' (default), 'dotnet' or 'cpp'.
+                            key_codec, value_codec - the codecs of the keys and values.
+        :return:    The dictionary of entries.
+        """
+        entries = {}
+        for page in self.__scan_pages(cache, **kwargs):
+            entries.update(self.__deserialize_pairs(page, **kwargs))
         return entries
 
+    def throttled_scan(self, cache, **kwargs):
+        """
+        Scan the cache partition by partition at a limited pace to run alongside the online operations.
+        The page size is adapted to the target page latency for the cursor of the next partition.
+        :param      cache:  The cache name.
+                    kwargs: partitions - the number of the cache partitions, 1024 by default.
+                            entries_per_second, bytes_per_second - the rate limits, unlimited if None.
+                            target_page_latency - the time of a page request to adapt the page size to, 0.05 s
+                            by default, cursor_page_size is the initial page size within min_page_size
+                            and max_page_size.
+                            probe - the function of the probe operation run every probe_interval seconds,
+                            the scan is paused while its latency is over probe_tolerance times of the lower median
+                            of the last probe_window ones, max_wait seconds at most.
+                            probe_key - the key of cache_contains_key probe if there's no probe function.
+                            Other options like filter, key_codec and value_codec are the same as for scan_query.
+        :return:    The iterator of the dictionaries of entries by pages. ThinClientException is raised after
+                    the last page if the number of scanned entries is not the cache size, e.g. the cache has more
+                    partitions.
+        """
+        partitions = kwargs.pop('partitions', 1024)
+        probe = kwargs.get('probe')
+        if probe is None and kwargs.get('probe_key') is not None:
+            probe = lambda: self.cache_contains_key(cache, kwargs['probe_key'], timeout=kwargs.get('timeout'))
+        throttle = ScanThrottle(**dict(kwargs, probe=probe))
+        count = 0
+        for partition in range(0, partitions):
+            options = dict(kwargs, partition=partition, cursor_page_size=throttle.page_size)
+            pages = self.__scan_pages(cache, **options)
+            while True:
+                start = time()
+                page = next(pages, None)
+                if page is None:
+                    break
+                latency = time() - start
+                entries = self.__deserialize_pairs(page, **kwargs)
+                count += page['binary_object_count'] // 2
+                yield entries
+                throttle.page_done(latency, len(entries), len(page['binary_object']))
+        self.__check_size(cache, count, partitions, **kwargs)
+
+    def scan_query_keys(self, cache, **kwargs):
+        """
+        Scan the cache keys, the values are skipped by their sizes without deserialization.
+        The scan options are the same as for scan_query.
+        :return:    The list of keys.
+        """
+        key_codec = kwargs.get('key_codec')
+        bin_obj = BinaryObject(zero_copy=self.zero_copy)
+        keys = []
+        for page in self.__scan_pages(cache, **kwargs):
+            binary = page['binary_object']
+            pos = 0
+            for item_idx in range(0, page['binary_object_count'], 2):
+                if key_codec is not None:
+                    key, pos = key_codec.decode(binary, pos)
+                else:
+                    key, pos = bin_obj.deserialize_entry(binary, pos, is_single_type=True)
+                keys.append(key)
+                pos = bin_obj.skip_entry(binary, pos)
+        return keys
+
+    def scan_query_columns(self, cache, columns=None, output='numpy', **kwargs):
+        """
+        Scan the cache into columns. The fields of map values become columns and the keys are in '_key' column,
+        the values which are not maps are in '_value' column.
+        :param      cache:      The cache name.
+                    columns:    The list of columns to return, all the columns are returned if None.
+                    output:     'numpy' for the dictionary of numpy arrays, 'pandas' for DataFrame
+                                or 'array' for the dictionary of python arrays (lists for not primitive columns).
+                    kwargs:     The scan options like cursor_page_size or partition.
+        :return:
+        """
+        decoder = ColumnarDecoder(columns, zero_copy=self.zero_copy)
+        for page in self.__scan_pages(cache, **kwargs):
+            decoder.decode_page(page['binary_object'], page['binary_object_count'])
+        return decoder.result(output)
+
+    def export_cache(self, cache, path, **kwargs):
+        """
+        Export the cache to the snapshot file. The scan pages are written as they are received, without decoding.
+        :param      cache:  The cache name.
+                    path:   The snapshot file path.
+                    kwargs: partitions - the list of partitions to scan one by one for the partition index,
+                            the whole cache is scanned as partition -1 if None. Other scan options like
+                            cursor_page_size are used for every partition scan.
+        :return:    The number of exported entries.
+        """
+        partitions = kwargs.get('partitions')
+        if partitions is None:
+            partitions = [-1]
+        count = 0
+        writer = SnapshotWriter(path)
+        try:
+            for partition in partitions:
+                options = dict(kwargs)
+                options['partition'] = partition
+                for page in self.__scan_pages(cache, **options):
+                    writer.write_page(partition, page['binary_object'], page['binary_object_count'] // 2)
+                    count += page['binary_object_count'] // 2
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+        return count
+
+    def import_cache(self, path, cache, **kwargs):
+        """
+        Import the snapshot file to the cache. The memory mapped pages are sent in put all requests
+        as they are, without deserialization.
+        :param      path:   The snapshot file path.
+                    cache:  The cache name.
+                    kwargs: partitions - the list of partitions to import, all the partitions are imported if None.
+        :return:    The number of imported entries.
+        """
+        count = 0
+        reader = SnapshotReader(path)
+        try:
+            for partition, binary, entry_count in reader.pages(kwargs.get('partitions')):
+                self.request = {
+                    'timeout': kwargs.get('timeout'),
+                    'cache': cache,
+                    'binary_objects': binary,
+                    'binary_object_count': entry_count,
+                }
+                self.__communicate('OP_CACHE_PUT_ALL')
+                count += entry_count
+        finally:
+            reader.close()
+        return count
+
+    @staticmethod
+    def __encode_key(key, **kwargs):
+        key_codec = kwargs.get('key_codec')
+        if key_codec is not None:
+            return key_codec.encode(key)
+        return BinaryObject().load_value(key).serialize()
+
+    def __encode_pair(self, key, value, **kwargs):
+        value_codec = kwargs.get('value_codec')
+        binary_key = self.__encode_key(key, **kwargs)
+        if value_codec is not None:
+            return binary_key, binary_key + value_codec.encode(value)
+        return binary_key, binary_key + BinaryObject().load_value(value).serialize()
+
+    def partition_digests(self, cache, partitions=1024, **kwargs):
+        """
+        Compute the digests of the cache partitions. The partitions are scanned one by one,
+        the digests are computed from the binary pairs without deserialization.
+        The partitions of the keys are checked, so the number of partitions or the affinity which differ from
+        the cache ones raise ThinClientException and the keys other than primitive, string or UUID ones
+        raise SyncException.
+        :return:    The PartitionDigests instance.
+        """
+        digests = PartitionDigests(partitions)
+        bin_obj = BinaryObject()
+        count = 0
+        for partition in range(0, partitions):
+            options = dict(kwargs)
+            options['partition'] = partition
+            for page in self.__scan_pages(cache, **options):
+                binary = page['binary_object']
+                pos = 0
+                for item_idx in range(0, page['binary_object_count'], 2):
+                    end_pos = bin_obj.skip_entry(binary, bin_obj.skip_entry(binary, pos))
+                    self.__check_partition(cache, affinity_partition(binary, partitions, pos), partition)
+                    digests.add(partition, binary[pos:end_pos])
+                    count += 1
+                    pos = end_pos
+        self.__check_size(cache, count, partitions, **kwargs)
+        return digests
+
+    def __check_size(self, cache, count, partitions, **kwargs):
+        # The entries out of the scanned partitions are not counted, the filtered scans are not comparable
+        if kwargs.get('filter') is not None:
+            return
+        size = self.cache_get_size(cache, **kwargs)
+        if count != size:
+            raise ThinClientException("%s of %s entries of cache %s are in %s partitions, the cache has more partitions"
+                                      % (count, size, cache, partitions))
+
+    @staticmethod
+    def __check_partition(cache, key_partition, partition):
+        if key_partition != partition:
+            raise ThinClientException("Key of partition %s is in partition %s of cache %s, the cache has another "
+                                      "number of partitions or affinity" % (key_partition, partition, cache))
+
+    def sync_cache(self, cache, entries, **kwargs):
+        """
+        Make the cache content equal to the entries with the minimal number of puts and removes.
+        The digests of the entries are compared with the digests of the cache partitions, only the partitions
+        with different digests are scanned and updated.
+        :param      cache:      The cache name.
+                    entries:    The mapping of keys and values, it's iterated twice.
+                    kwargs:     partitions - the number of the cache partitions, 1024 by default.
+                                manifest - the file of the partition digests of the previous sync, the digests of the
+                                cache are taken from it instead of scanning of all the partitions.
+                                The digests of the entries are saved to the file after sync.
+                                verify - scan the partitions for their digests even if there's the manifest.
+                                key_codec, value_codec - the codecs of the keys and values.
+                                Other scan options like cursor_page_size are used for the partition scans.
+        The keys have to be primitive, string or UUID ones and the partitions have to be the ones of the cache,
+        otherwise SyncException or ThinClientException is raised before any write.
+        :return:    The dictionary of the numbers of 'partitions' updated, 'puts' and 'removes'.
+        """
+        partitions = kwargs.pop('partitions', 1024)
+        manifest = kwargs.pop('manifest', None)
+        verify = kwargs.pop('verify', False)
+        local_digests = PartitionDigests(partitions)
+        for key, value in entries.items():
+            binary_key, binary = self.__encode_pair(key, value, **kwargs)
+            local_digests.add(affinity_partition(binary_key, partitions), binary)
+        if manifest is not None and not verify and exists(manifest):
+            remote_digests = PartitionDigests.load(manifest)
+            if remote_digests.partitions != partitions:
+                raise ThinClientException("Manifest %s is for %s partitions, not %s"
+                                          % (manifest, remote_digests.partitions, partitions))
+        else:
+            remote_digests = self.partition_digests(cache, partitions, **kwargs)
+        changed = set(local_digests.differ(remote_digests))
+        local_entries = {partition: {} for partition in changed}
+        if len(changed) > 0:
+            for key, value in entries.items():
+                binary_key, binary = self.__encode_pair(key, value, **kwargs)
+                partition = affinity_partition(binary_key, partitions)
+                if partition in changed:
+                    local_entries[partition][key] = value
+        # The changed partitions are scanned and checked before any write
+        remote_entries = {}
+        for partition in sorted(changed):
+            remote_entries[partition] = self.scan_query(cache, **dict(kwargs, partition=partition))
+            for key in remote_entries[partition].keys():
+                self.__check_partition(cache, affinity_partition(self.__encode_key(key, **kwargs), partitions),
+                                       partition)
+        stats = {'partitions': len(changed), 'puts': 0, 'removes': 0}
+        for partition in sorted(changed):
+            puts = {}
+            for key, value in local_entries[partition].items():
+                if key not in remote_entries[partition] or remote_entries[partition][key] != value:
+                    puts[key] = value
+            removes = [key for key in remote_entries[partition].keys() if key not in entries]
+            put_keys = list(puts.keys())
+            for start in range(0, len(put_keys), self.keys_chunk_size):
+                self.cache_put_all(cache, {key: puts[key] for key in put_keys[start:start+self.keys_chunk_size]},
+                                   **kwargs)
+            if len(removes) > 0:
+                self.cache_remove_keys(cache, removes, **kwargs)
+            stats['puts'] += len(puts)
+            stats['removes'] += len(removes)
+        if manifest is not None:
+            local_digests.save(manifest)
+        return stats
+
+    def copy_partition(self, src, dst, partition, transform=None, **kwargs):
+        """
+        Copy the partition of the source cache to the destination cache page by page.
+        Without transform the scan pages are sent in put all requests as they are received, without deserialization.
+        :param      src:        The source cache name.
+                    dst:        The destination cache name.
+                    partition:  The partition, the whole cache is copied if -1.
+                    transform:  The function of key and value returning the new (key, value) or None to skip the entry.
+                    kwargs:     The scan options like cursor_page_size, key_codec and value_codec.
+        :return:    The dictionary of the numbers of entries 'scanned' and 'written'.
+        """
+        count = 0
+        scanned = 0
+        for page in self.__scan_pages(src, **dict(kwargs, partition=partition)):
+            if page['binary_object_count'] == 0:
+                continue
+            scanned += page['binary_object_count'] // 2
+            if transform is None:
+                self.request = {
+                    'timeout': kwargs.get('timeout'),
+                    'cache': dst,
+                    'binary_objects': page['binary_object'],
+                    'binary_object_count': page['binary_object_count'] // 2,
+                }
+                self.__communicate('OP_CACHE_PUT_ALL')
+                count += page['binary_object_count'] // 2
+                continue
+            entries = {}
+            for key, value in self.__deserialize_pairs(page, **kwargs).items():
+                entry = transform(key, value)
+                if entry is not None:
+                    entries[entry[0]] = entry[1]
+            if len(entries) > 0:
+                self.cache_put_all(dst, entries, **kwargs)
+                count += len(entries)
+        return {'scanned': scanned, 'written': count}
+
+    def copy_cache(self, src, dst, transform=None, workers=4, **kwargs):
+        """
+        Copy the source cache to the destination cache by partitions scanned and written in parallel connections.
+        Every connection copies one partition at a time page by page, so at most workers pages are in memory
+        and the scans wait for the writes.
+        :param      src:        The source cache name.
+                    dst:        The destination cache name.
+                    transform:  The function of key and value returning the new (key, value) or None to skip the entry.
+                    workers:    The number of connections.
+                    kwargs:     partitions - the number of the source cache partitions, 1024 by default.
+                                progress - the file of the copied partitions and their numbers of scanned entries,
+                                the partitions are skipped if the copy is resumed.
+                                Other options like cursor_page_size are passed to copy_partition.
+        :return:    The dictionary of the numbers of 'partitions' and 'entries' copied. ThinClientException is raised
+                    if the number of scanned entries is not the source cache size, e.g. the cache has more partitions
+                    or it was changed during the copy. The first failed partition cancels the rest.
+        """
+        partitions = kwargs.pop('partitions', 1024)
+        progress = kwargs.pop('progress', None)
+        done = {}
+        if progress is not None and exists(progress):
+            with open(progress) as progress_file:
+                for line in progress_file:
+                    if line.strip() != '':
+                        partition, scanned = line.split()
+                        done[int(partition)] = int(scanned)
+        pool = ThinClientPool(workers, self.node, **self.kwargs)
+        stats = {'partitions': 0, 'entries': 0}
+        progress_file = None
+        try:
+            if progress is not None:
+                progress_file = open(progress, 'a')
+            args = {}
+            for partition in range(0, partitions):
+                if partition not in done:
+                    args[partition] = ['copy_partition', [src, dst, partition, transform], kwargs]
+            scanned = sum(done.values())
+            for partition, result in pool.as_completed(args):
+                stats['partitions'] += 1
+                stats['entries'] += result['result']['written']
+                scanned += result['result']['scanned']
+                if progress_file is not None:
+                    progress_file.write('%s %s\n' % (partition, result['result']['scanned']))
+                    progress_file.flush()
+            self.__check_size(src, scanned, partitions, **kwargs)
+        finally:
+            if progress_file is not None:
+                progress_file.close()
+            pool.close()
+        return stats
+
+    def large_objects(self, cache, **kwargs):
+        """
+        Get the store of big byte values split into chunks, see LargeObjectStore for the options.
+        Use LargeObjectStore with ThinClientPool to send the chunks in parallel.
+        """
+        return LargeObjectStore(self, cache, **kwargs)
+
+    def typed_cache(self, cache, key=None, value=None):
+        """
+        Get a view of the cache with the declared key and value types.
+        :param      cache:  The cache name.
+                    key:    The binary type of keys, e.g. 'int', 'long', 'string'. The type is inferred if None.
+                    value:  The binary type of values. The type is inferred if None.
+        :return:    The TypedCache instance.
+        """
+        return TypedCache(self, cache, key, value)
+
+
+class TypedCache:
+
+    def __init__(self, client, cache, key=None, value=None):
+        self.client = client
+        self.cache = cache
+        self.codecs = {}
+        if key is not None:
+            self.codecs['key_codec'] = BinaryCodec(key, zero_copy=client.zero_copy)
+        if value is not None:
+            self.codecs['value_codec'] = BinaryCodec(value, zero_copy=client.zero_copy)
+
+    def get(self, key):
+        return self.client.cache_get(self.cache, key, **self.codecs)
+
+    def put(self, key, val):
+        return self.client.cache_put(self.cache, key, val, **self.codecs)
+
+    def get_all(self, keys):
+        return self.client.cache_get_all(self.cache, keys, **self.codecs)
+
+    def put_all(self, data):
+        return self.client.cache_put_all(self.cache, data, **self.codecs)
+
+    def put_if_absent(self, key, val):
+        return self.client.cache_put_if_absent(self.cache, key, val, **self.codecs)
+
+    def get_and_put(self, key, val):
+        return self.client.cache_get_and_put(self.cache, key, val, **self.codecs)
+
+    def get_and_replace(self, key, val):
+        return self.client.cache_get_and_replace(self.cache, key, val, **self.codecs)
+
+    def get_and_remove(self, key):
+        return self.client.cache_get_and_remove(self.cache, key, **self.codecs)
+
+    def get_and_put_if_absent(self, key, val):
+        return self.client.cache_get_and_put_if_absent(self.cache, key, val, **self.codecs)
+
+    def replace(self, key, val):
+        return self.client.cache_replace(self.cache, key, val, **self.codecs)
+
+    def replace_if_equals(self, key, old_val, new_val):
+        return self.client.cache_replace_if_equals(self.cache, key, old_val, new_val, **self.codecs)
+
+    def contains_key(self, key):
+        return self.client.cache_contains_key(self.cache, key, **self.codecs)
+
+    def contains_keys(self, keys):
+        return self.client.cache_contains_keys(self.cache, keys, **self.codecs)
+
+    def clear_key(self, key):
+        return self.client.cache_clear_key(self.cache, key, **self.codecs)
+
+    def clear_keys(self, keys):
+        return self.client.cache_clear_keys(self.cache, keys, **self.codecs)
+
+    def remove_key(self, key):
+        return self.client.cache_remove_key(self.cache, key, **self.codecs)
+
+    def remove_if_equals(self, key, val):
+        return self.client.cache_remove_if_equals(self.cache, key, val, **self.codecs)
+
+    def remove_keys(self, keys):
+        return self.client.cache_remove_keys(self.cache, keys, **self.codecs)
+
+    def get_size(self):
+        return self.client.cache_get_size(self.cache)
+
+    def clear(self):
+        return self.client.cache_clear(self.cache)
+
+    def scan_query(self, **kwargs):
+        return self.client.scan_query(self.cache, **dict(kwargs, **self.codecs))
+
+    def scan_query_keys(self, **kwargs):
+        return self.client.scan_query_keys(self.cache, **dict(kwargs, **self.codecs))
+
 
 class ThinClientPool:
 
-    def __init__(self, threads, addr_port=None):
+    # Operations collapsed with the collapse option
+    collapsible = ['cache_get', 'cache_get_all']
+    # The order of the keys of these methods does not matter
+    key_set_methods = ['cache_get_all', 'cache_contains_keys']
+
+    def __init__(self, threads, addr_port=None, **kwargs):
+        """
+        :param      threads:    The number of connections, it's the maximal number of operations in progress.
+                    addr_port:  The address and port of the node.
+                    kwargs:     adaptive - limit the operations in progress by AIMDLimiter driven by the latencies
+                                and the errors of the operations, it may be the limiter itself.
+                                queue_size - the maximal number of waiting operations, unlimited if None.
+                                shed - fail the least important operation with ThinClientPoolOverloadException
+                                when the queue is full instead of blocking submit.
+                                hot_keys - True or HotKeyTracker shared by the thin clients of the pool.
+                                key_filters - KeyFilters shared by the thin clients of the pool,
+                                e.g. pool.submit('build_key_filter', cache) builds the filter for all of them.
+                                collapse - submit one cache_get or cache_get_all for the same arguments
+                                while it's in progress, the callers get the same result.
+                                Other options like nodes, standby or retries are passed to the thin clients.
+        """
         self.threads = threads
-        self.kwargs = {}
         self.addr_port = addr_port
+        self.limiter = kwargs.pop('adaptive', None)
+        if self.limiter is True:
+            self.limiter = AIMDLimiter(threads)
+        elif self.limiter is False:
+            self.limiter = None
+        self.queue_size = kwargs.pop('queue_size', None)
+        self.shed = kwargs.pop('shed', False)
+        self.single_flight = kwargs.pop('collapse', None)
+        if self.single_flight is True:
+            self.single_flight = SingleFlight()
+        elif self.single_flight is False:
+            self.single_flight = None
+        # The key filters are built and updated by all the connections together
+        if not isinstance(kwargs.get('key_filters'), KeyFilters):
+            kwargs['key_filters'] = KeyFilters()
+        # The hot keys are tracked by all the connections together
+        if kwargs.get('hot_keys') is True:
+            kwargs['hot_keys'] = HotKeyTracker()
+        # Options for the thin clients, e.g. nodes, standby or retries for failover
+        self.kwargs = kwargs
+        # Operations shared by all the workers ordered by priority, an idle worker takes the next one
+        self.queue = []
+        self.sequence = count()
+        self.in_flight = 0
+        self.closing = False
+        self.condition = Condition()
+        self.workers = []
+        self.workers_lock = Lock()
+        # The pool is reset in the child process after fork, the workers are started again with fork_prewarm
+        self.pid = getpid()
+        self.fork_prewarm = kwargs.get('fork_prewarm', False)
+        fork_instances.add(self)
 
-    def __exec_thin_client(self, *operations_args):
-        if len(operations_args) == 0:
-            return {}
-        thin = ThinClient()
-        thin.connect(self.addr_port)
-        results = {}
-        for arg in operations_args:
-            operation_id = arg[0]
-            method_name = arg[1]
-            if len(arg) == 2:
-                val = getattr(thin, method_name)()
-            elif len(arg) == 3:
-                val = getattr(thin, method_name)(*arg[2])
+    def reset_after_fork(self):
+        """
+        Drop the workers and the operations inherited from the parent process, they belong to the parent.
+        The workers are started with new connections on the next operation, or right after fork with fork_prewarm.
+        Called automatically in the child process after fork.
+        """
+        if self.pid == getpid():
+            return
+        self.pid = getpid()
+        self.queue = []
+        self.in_flight = 0
+        self.closing = False
+        self.condition = Condition()
+        self.workers = []
+        self.workers_lock = Lock()
+        if self.limiter is not None:
+            self.limiter.lock = Lock()
+        if self.single_flight is not None:
+            self.single_flight.reset()
+        if self.fork_prewarm:
+            self.__start_workers()
+
+    def hot_keys(self, cache, count=10):
+        """
+        Get the hottest keys of the cache sampled by all the connections of the pool.
+        """
+        if not isinstance(self.kwargs.get('hot_keys'), HotKeyTracker):
+            raise ThinClientPoolException("Hot keys are not tracked, use hot_keys option")
+        return self.kwargs['hot_keys'].hot_keys(cache, count)
+
+    @property
+    def limit(self):
+        if self.limiter is None:
+            return self.threads
+        return min(self.threads, self.limiter.limit)
+
+    def __take(self):
+        with self.condition:
+            while len(self.queue) == 0 or self.in_flight >= self.limit:
+                if self.closing and len(self.queue) == 0:
+                    return None, 0
+                self.condition.wait()
+            item = heappop(self.queue)[2]
+            self.in_flight += 1
+            # The space in the queue is released
+            self.condition.notify_all()
+            return item, self.in_flight
+
+    def __done(self, in_flight, latency=None, dropped=False):
+        if self.limiter is not None and latency is not None:
+            self.limiter.update(latency, in_flight, dropped)
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def __worker(self):
+        thin = None
+        if self.fork_prewarm:
+            try:
+                thin = ThinClient(**self.kwargs)
+                thin.connect(self.addr_port)
+            except error:
+                # Connect on the first operation
+                thin = None
+        while True:
+            item, in_flight = self.__take()
+            if item is None:
+                break
+            future, method_name, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                self.__done(in_flight)
+                continue
+            start = time()
+            dropped = False
+            try:
+                if thin is None:
+                    thin = ThinClient(**self.kwargs)
+                    thin.connect(self.addr_port)
+                result = getattr(thin, method_name)(*args, **kwargs)
+            except BaseException as e:
+                # Timeouts and connection errors are the signs of overload unlike the errors of operations
+                dropped = isinstance(e, (ThinClientTimeoutException, error))
+                if thin is not None and thin.sock is None:
+                    thin = None
+                self.__done(in_flight, time() - start, dropped)
+                future.set_exception(e)
+                continue
+            self.__done(in_flight, time() - start, dropped)
+            future.set_result(result)
+        if thin is not None:
+            thin.disconnect()
+
+    def __start_workers(self):
+        with self.workers_lock:
+            while len(self.workers) < self.threads:
+                worker = Thread(target=self.__worker, daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    def __shed(self, priority):
+        # The least important operation is the latest one of the lowest priority, new or waiting
+        victim = max(self.queue)
+        if victim[0] <= priority:
+            return False
+        self.queue.remove(victim)
+        heapify(self.queue)
+        victim[2][0].set_exception(ThinClientPoolOverloadException(
+            "Operation %s of priority %s shed" % (victim[2][1], victim[0])
+        ))
+        return True
+
+    def submit(self, method_name, *args, priority=0, **kwargs):
+        """
+        Schedule an operation on the first idle connection of the pool.
+        :param      method_name:    The ThinClient method name, e.g. 'cache_get'.
+                    args, kwargs:   The arguments of the method.
+                    priority:       The operations of lower priority values are executed first and shed first
+                                    with larger values, e.g. 0 for online requests and 1 for batch jobs.
+        :return:    The concurrent.futures.Future of the operation result.
+        """
+        if not hasattr(ThinClient, method_name):
+            raise ThinClientPoolException("Unknown operation %s" % method_name)
+        if self.pid != getpid():
+            self.reset_after_fork()
+        self.__start_workers()
+        if self.single_flight is not None and method_name in self.collapsible:
+            if method_name in self.key_set_methods and len(args) > 1:
+                flight_key = SingleFlight.key(method_name, args[0], *args[2:], key_set=args[1], **kwargs)
             else:
-                val = getattr(thin, method_name)(*arg[2], **arg[3])
-            results[operation_id] = {
-                'result': val,
-                'method': method_name
-            }
-            if len(arg) == 3:
-                results[operation_id]['args'] = arg[2]
-            if len(arg) == 4:
-                results[operation_id]['kwargs'] = arg[3]
-        thin.disconnect()
-        return results
+                flight_key = SingleFlight.key(method_name, *args, **kwargs)
+            if flight_key is not None:
+                return self.__collapse(flight_key, method_name, args, kwargs, priority)
+        return self.__enqueue(method_name, args, kwargs, priority)
+
+    def __collapse(self, flight_key, method_name, args, kwargs, priority):
+        call, leader = self.single_flight.begin(flight_key)
+        if leader:
+            self.__enqueue(method_name, args, kwargs, priority).add_done_callback(
+                lambda done: self.single_flight.end(flight_key, call, None if done.exception() else done.result(),
+                                                    done.exception())
+            )
+        # Every caller has its own future, so it may be cancelled or waited with its own timeout
+        future = Future()
+        call.add_done_callback(lambda done: self.__share_result(done, future, method_name))
+        return future
+
+    @staticmethod
+    def __share_result(call, future, method_name):
+        if not future.set_running_or_notify_cancel():
+            return
+        if call.exception() is not None:
+            future.set_exception(call.exception())
+        elif method_name == 'cache_get_all':
+            # The callers may change their results
+            future.set_result(dict(call.result()))
+        else:
+            future.set_result(call.result())
+
+    def __enqueue(self, method_name, args, kwargs, priority):
+        future = Future()
+        with self.condition:
+            while self.queue_size is not None and len(self.queue) >= self.queue_size:
+                if self.shed:
+                    if not self.__shed(priority):
+                        future.set_exception(ThinClientPoolOverloadException(
+                            "Operation %s of priority %s shed, %s operations are waiting"
+                            % (method_name, priority, len(self.queue))
+                        ))
+                        return future
+                else:
+                    self.condition.wait()
+            heappush(self.queue, (priority, next(self.sequence), (future, method_name, args, kwargs)))
+            self.condition.notify_all()
+        return future
+
+    def close(self):
+        """
+        Wait for the scheduled operations and disconnect the pool connections.
+        """
+        with self.workers_lock:
+            with self.condition:
+                self.closing = True
+                self.condition.notify_all()
+            for worker in self.workers:
+                worker.join()
+            self.workers = []
+            self.closing = False
+
+    def __submit_operations(self, args, priority=0):
+        if not isinstance(args, dict):
+            raise ThinClientPoolException(
+                'Wrong argument type: expected dictionary, found %s' % type(args).__name__
+            )
+        futures = {}
+        for oper_id in args.keys():
+            oper_args = list(args[oper_id])
+            if len(oper_args) == 0:
+                raise ThinClientPoolException("Arguments number for operation %s is 0: %s" % (oper_id, [oper_id]))
+            method_args = []
+            if len(oper_args) > 1:
+                method_args = oper_args[1]
+            method_kwargs = {}
+            if len(oper_args) > 2:
+                method_kwargs = oper_args[2]
+            future = self.submit(oper_args[0], *method_args, priority=priority, **method_kwargs)
+            futures[future] = oper_id
+        return futures
+
+    @staticmethod
+    def __operation_result(args, oper_id, future):
+        result = {
+            'result': future.result(),
+            'method': args[oper_id][0]
+        }
+        if len(args[oper_id]) > 1:
+            result['args'] = args[oper_id][1]
+        if len(args[oper_id]) > 2:
+            result['kwargs'] = args[oper_id][2]
+        return result
+
+    def as_completed(self, args, timeout=None, priority=0):
+        """
+        Execute operations in parallel threads and yield the results as soon as they are ready.
+        :param      args:       The dictionary of arguments for operations, the same as for execute.
+                    timeout:    The maximal time to wait for all the results, seconds.
+                    priority:   The priority of the operations, see submit.
+        :return:    The iterator of (operation_id, result) tuples in the order of completion,
+                    the result format is the same as for execute. The operations which are not started yet
+                    are cancelled if the iteration stops early, e.g. on the failure of an operation.
+        """
+        started = len(self.workers) > 0
+        futures = self.__submit_operations(args, priority)
+        try:
+            for future in as_completed(futures.keys(), timeout=timeout):
+                yield futures[future], self.__operation_result(args, futures[future], future)
+        finally:
+            for future in futures.keys():
+                future.cancel()
+            if not started:
+                self.close()
 
     def execute(self, args, **kwargs):
         """
@@ -635,36 +2418,21 @@ class ThinClientPool:
                                 operation_id_2: [method_name, args[], kwargs{}],
                                 ...
                             }
-                    kwargs: Various options for result formatting
-        :return:
+                    kwargs: Various options for result formatting and priority of the operations, see submit.
+        :return:    The list of threads dictionaries of results by operation ids, the operations are assigned
+                    to the threads in turn. The connections are closed after the operations, unless the pool
+                    was started before by submit or another batch.
         """
-        pool = ThreadPool(self.threads)
-        grouped_args = []
-        for idx in range(0, self.threads):
-            grouped_args.append([])
-        idx = 0
-        if isinstance(args, dict):
-            for oper_id in args.keys():
-                if idx == self.threads:
-                    idx = 0
-                oper_args = [oper_id]
-                for oper_arg in args[oper_id]:
-                    oper_args.append(oper_arg)
-                if len(oper_args) == 1:
-                    raise ThinClientPoolException("Arguments number for operation %s is 0: %s" % (oper_id, oper_args))
-                # if len(oper_args) == 2:
-                #     oper_args.append([])
-                # if len(oper_args) == 3:
-                #     oper_args.append([])
-                grouped_args[idx].append(oper_args)
-                idx += 1
-        else:
-            raise ThinClientPoolException(
-                'Wrong argument type: expected dictionary, found %s' % type(args).__name__
-            )
-        grouped_results = pool.starmap(self.__exec_thin_client, grouped_args)
-        pool.close()
-        pool.join()
+        started = len(self.workers) > 0
+        futures = self.__submit_operations(args, kwargs.get('priority', 0))
+        wait(futures.keys())
+        if not started:
+            self.close()
+        operation_ids = {oper_id: idx for idx, oper_id in enumerate(args.keys())}
+        grouped_results = [{} for idx in range(0, self.threads)]
+        for future, oper_id in sorted(futures.items(), key=lambda item: operation_ids[item[1]]):
+            result = self.__operation_result(args, oper_id, future)
+            grouped_results[operation_ids[oper_id] % self.threads][oper_id] = result
         result_type = kwargs.get('result_type')
         if result_type is not None:
             if result_type == 'result_to_list':
@@ -682,7 +2450,10 @@ class ThinClientPool:
                     for oper_id in grouped_result.keys():
                         joined_list.append(grouped_result[oper_id])
                 return joined_list
-        results = {}
-        for grouped_result in grouped_results:
-            results.update(grouped_result)
         return grouped_results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+from collections import deque
+from time import perf_counter, sleep
+
+
+class TokenBucket:
+    """
+    Token bucket rate limit: the tokens are added at rate per second up to burst, consume waits for the tokens.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.tokens = self.burst
+        self.updated = perf_counter()
+
+    def consume(self, tokens):
+        now = perf_counter()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= tokens
+        if self.tokens < 0:
+            # The debt is paid by waiting, so a request bigger than the burst is allowed too
+            sleep(-self.tokens / self.rate)
+
+
+class ScanThrottle:
+    """
+    Pace of a background scan: the rate limits of entries and bytes per second, the page size adapted to the target
+    page latency and the pauses while the latency of the probe operation is degraded in comparison with its recent
+    lower median.
+    """
+
+    def __init__(self, **kwargs):
+        self.entries = None
+        self.bytes = None
+        if kwargs.get('entries_per_second') is not None:
+            self.entries = TokenBucket(kwargs['entries_per_second'])
+        if kwargs.get('bytes_per_second') is not None:
+            self.bytes = TokenBucket(kwargs['bytes_per_second'])
+        self.page_size = kwargs.get('cursor_page_size', 1000)
+        self.min_page_size = kwargs.get('min_page_size', 10)
+        self.max_page_size = kwargs.get('max_page_size', 10000)
+        self.target_page_latency = kwargs.get('target_page_latency', 0.05)
+        self.probe = kwargs.get('probe')
+        self.probe_interval = kwargs.get('probe_interval', 1)
+        self.probe_tolerance = kwargs.get('probe_tolerance', 3)
+        # The latencies below are not degraded whatever the baseline is, they are within the timer jitter
+        self.min_probe_latency = kwargs.get('min_probe_latency', 0.001)
+        self.pause = kwargs.get('pause', 0.5)
+        self.max_pause = kwargs.get('max_pause', 30)
+        # The total pause of one check, the scan goes on if the latency is not restored by then
+        self.max_wait = kwargs.get('max_wait', 60)
+        self.probe_latencies = deque(maxlen=kwargs.get('probe_window', 20))
+        self.probe_baseline = None
+        self.probed = None
+        self.paused = 0
+
+    def page_done(self, latency, entries, size):
+        """
+        Account the received page and wait for the rate limits.
+        :param      latency:    The time of the page request, seconds.
+                    entries:    The number of entries in the page.
+                    size:       The page size in bytes.
+        """
+        if self.target_page_latency is not None and entries > 0 and latency > 0:
+            # The page size is changed by two times at most, it's applied to the next cursor
+            ratio = min(2.0, max(0.5, self.target_page_latency / latency))
+            if entries >= self.page_size or ratio < 1:
+                self.page_size = int(min(self.max_page_size, max(self.min_page_size, self.page_size * ratio)))
+        if self.entries is not None:
+            self.entries.consume(entries)
+        if self.bytes is not None:
+            self.bytes.consume(size)
+        self.check_probe()
+
+    def __probe_latency(self):
+        start = perf_counter()
+        self.probe()
+        return perf_counter() - start
+
+    def __degraded(self, latency):
+        return latency > max(self.min_probe_latency, self.probe_baseline * self.probe_tolerance)
+
+    def check_probe(self):
+        """
+        Run the probe once per probe_interval and wait while its latency is degraded.
+        """
+        if self.probe is None:
+            return
+        now = perf_counter()
+        if self.probed is not None and now - self.probed < self.probe_interval:
+            return
+        self.probed = now
+        latency = self.__probe_latency()
+        # The baseline follows the load and a single fast outlier does not make the normal latency degraded,
+        # the latencies measured while paused are not taken into account
+        self.probe_latencies.append(latency)
+        recent = sorted(self.probe_latencies)
+        self.probe_baseline = recent[(len(recent) - 1) // 2]
+        pause = self.pause
+        waited = 0
+        while self.__degraded(latency) and waited < self.max_wait:
+            wait = min(pause, self.max_wait - waited)
+            sleep(wait)
+            self.paused += wait
+            waited += wait
+            pause = min(self.max_pause, pause * 2)
+            latency = self.__probe_latency()
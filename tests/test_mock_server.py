@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+
+from array import array
+from ignite import BinaryObject, CacheConfiguration, ComplexObject, HotKeyTracker, LargeObjectException, LargeObjectStore, \
+    SingleFlight, ThinClient, ThinClientException, ThinClientPool, ThinClientPoolOverloadException, \
+    ThinClientTimeoutException
+from ignite.bench import ZipfianGenerator, main as bench_main
+from ignite.limiter import AIMDLimiter
+from ignite.mockserver import MockServer
+from ignite.sync import affinity_partition
+from ignite.throttle import ScanThrottle
+from os import _exit, close as os_fd_close, fork, pipe, read, remove, urandom, waitpid, write
+from random import Random
+from socket import AF_INET, SOCK_STREAM, socket
+from tempfile import mkstemp
+from threading import Thread
+from time import sleep, time
+
+mock = MockServer(caches=['atomic'], partitions=16, filters={
+    'org.apache.ignite.tests.ModuloFilter': lambda key, value, scan_filter: key % scan_filter.field('modulo') == 0
+})
+thin = ThinClient()
+
+
+def setup_module():
+    mock.start()
+    thin.connect(mock.address)
+
+
+def teardown_module():
+    thin.disconnect()
+    mock.stop()
+
+
+def test_put_get():
+    thin.cache_clear('atomic')
+    thin.cache_put('atomic', 1, 'value 1')
+    value = thin.cache_get('atomic', 1)
+    assert value == 'value 1', "Received value is 'value 1' (%s)" % value
+    assert thin.cache_get('atomic', 2) is None, 'No value for key 2'
+    thin.cache_put('atomic', 3, memoryview(array('q', [1, 2])))
+    value = thin.cache_get('atomic', 3)
+    assert value == array('q', [1, 2]).tobytes(), 'All bytes of typed buffer stored (%s)' % value
+
+
+def test_put_all_scan_query():
+    thin.cache_clear('atomic')
+    send_entries = {}
+    for i in range(1, 101):
+        send_entries[i] = 'value %s' % i
+    thin.cache_put_all('atomic', send_entries)
+    assert thin.cache_get_all('atomic', [1, 2, 1000]) == {1: 'value 1', 2: 'value 2'}, 'Only stored keys returned'
+    assert thin.scan_query('atomic', cursor_page_size=30) == send_entries, 'All entries scanned'
+    partitioned_entries = {}
+    for partition in range(0, 16):
+        partitioned_entries.update(thin.scan_query('atomic', partition=partition))
+    assert partitioned_entries == send_entries, 'All entries scanned by partitions'
+
+
+def test_scan_query_filter():
+    thin.cache_clear('atomic')
+    send_entries = {}
+    for i in range(1, 101):
+        send_entries[i] = 'value %s' % i
+    thin.cache_put_all('atomic', send_entries)
+    scan_filter = ComplexObject('org.apache.ignite.tests.ModuloFilter', {'modulo': 10}, types={'modulo': 'int'})
+    filtered_entries = thin.scan_query('atomic', filter=scan_filter, cursor_page_size=3)
+    assert filtered_entries == {i: 'value %s' % i for i in range(10, 101, 10)}, 'Filtered entries scanned'
+    keys = thin.scan_query_keys('atomic', filter=scan_filter)
+    assert sorted(keys) == list(range(10, 101, 10)), 'Keys of filtered entries scanned (%s)' % keys
+    assert sorted(thin.scan_query_keys('atomic')) == list(range(1, 101)), 'All keys scanned'
+
+
+def test_missing_cache():
+    recent_exception = ''
+    try:
+        thin.cache_get('missing', 1)
+    except ThinClientException as e:
+        recent_exception = str(e)
+    assert 'Cache does not exist' in recent_exception, 'Missing cache error (%s)' % recent_exception
+
+    recent_exception = ''
+    try:
+        ThinClient().connect([])
+    except ThinClientException as e:
+        recent_exception = str(e)
+    assert 'No nodes' in recent_exception, 'No nodes error (%s)' % recent_exception
+
+    # The node accepts connections but never answers the handshake
+    hung = socket(AF_INET, SOCK_STREAM)
+    hung.bind(('127.0.0.1', 0))
+    hung.listen(8)
+    client = ThinClient(timeout=0.3)
+    client.connect([hung.getsockname(), mock.address])
+    hung.close()
+    assert client.node == mock.address, 'Connected to the node after the hung one (%s)' % (client.node,)
+    client.disconnect()
+
+
+def test_bench():
+    report = bench_main(['--mock', '--workload', 'update-heavy', '--distribution', 'zipfian',
+                         '--operations', '200', '--keys', '100', '--concurrency', '2'])
+    assert report['errors'] == 0, 'No errors (%s)' % report['errors']
+    assert sum(len(latencies) for latencies in report['operations'].values()) == 200, 'All operations done'
+    for items in [1, 2]:
+        keys = ZipfianGenerator(items, Random(1))
+        drawn = set(keys.next() for idx in range(0, 100))
+        assert drawn == set(range(0, items)), 'Zipfian keys of %s items (%s)' % (items, drawn)
+
+
+def test_timeout():
+    slow_mock = MockServer(caches=['atomic'], delay=0.3).start()
+    slow_thin = ThinClient()
+    slow_thin.connect(slow_mock.address)
+    slow_thin.cache_put('atomic', 1, 'value 1')
+    recent_exception = None
+    try:
+        slow_thin.cache_get('atomic', 1, timeout=0.1)
+    except ThinClientTimeoutException as e:
+        recent_exception = e
+    assert recent_exception is not None, 'Operation timed out'
+    value = slow_thin.cache_get('atomic', 1)
+    slow_thin.disconnect()
+    slow_mock.stop()
+    assert value == 'value 1', 'Response of the timed out request dropped (%s)' % value
+
+
+def test_hedged_get():
+    slow_mock = MockServer(caches=['atomic'], delay=0.5).start()
+    hedged_thin = ThinClient(nodes=[slow_mock.address, mock.address], hedge_delay=0.05)
+    hedged_thin.connect()
+    thin.cache_put('atomic', 1, 'value 1')
+    start = time()
+    value = hedged_thin.cache_get('atomic', 1)
+    elapsed = time() - start
+    hedged_thin.disconnect()
+    slow_mock.stop()
+    assert value == 'value 1', 'Value received from the second node (%s)' % value
+    assert elapsed < 0.4, 'Value received before the slow node response (%s)' % elapsed
+    slow_mock = MockServer(caches=['atomic'], delay=0.3).start()
+    hedged_thin = ThinClient(nodes=[slow_mock.address, slow_mock.address], hedge_delay=0.05)
+    hedged_thin.connect()
+    hedged_thin.cache_put_all('atomic', {1: 'one', 2: 'two'})
+    recent_exception = None
+    try:
+        hedged_thin.cache_get('atomic', 1, timeout=0.1)
+    except ThinClientTimeoutException as e:
+        recent_exception = e
+    assert recent_exception is not None, 'Hedged operation timed out'
+    value = hedged_thin.cache_get('atomic', 2)
+    hedged_thin.disconnect()
+    slow_mock.stop()
+    assert value == 'two', 'Responses of the timed out hedged request dropped (%s)' % value
+
+
+def test_failover_timeout():
+    # The node accepts connections but never answers the handshake
+    hung = socket(AF_INET, SOCK_STREAM)
+    hung.bind(('127.0.0.1', 0))
+    hung.listen(8)
+    client = ThinClient(nodes=[mock.address, hung.getsockname()], timeout=3)
+    client.connect()
+    client.sock.close()
+    recent_exception = None
+    start = time()
+    try:
+        client.cache_get('atomic', 1, timeout=0.5)
+    except ThinClientTimeoutException as e:
+        recent_exception = e
+    elapsed = time() - start
+    client.disconnect()
+    hung.close()
+    assert recent_exception is not None and elapsed < 1, 'Failover is limited by the timeout (%s)' % elapsed
+
+
+def test_pool_execute():
+    thin.cache_put_all('atomic', {i: 'value %s' % i for i in range(0, 5)})
+    pool = ThinClientPool(2, mock.address)
+    results = pool.execute({i: ['cache_get', ['atomic', i]] for i in range(0, 5)})
+    assert [sorted(grouped.keys()) for grouped in results] == [[0, 2, 4], [1, 3]], 'Results by threads (%s)' % results
+    assert results[1][3]['result'] == 'value 3', 'Result of operation 3 (%s)' % results[1][3]
+    assert len(pool.workers) == 0, 'Connections of execute are closed'
+    with ThinClientPool(2, mock.address) as pool:
+        assert pool.submit('cache_get', 'atomic', 1).result() == 'value 1', 'Pool used in with block'
+        pool.execute({1: ['cache_get', ['atomic', 1]]})
+        assert len(pool.workers) == 2, 'Connections of started pool are kept by execute'
+    assert len(pool.workers) == 0, 'Pool closed by with block'
+    slow_mock = MockServer(caches=['atomic'], delay=0.05).start()
+    pool = ThinClientPool(1, slow_mock.address)
+    start = time()
+    recent_exception = None
+    try:
+        list(pool.as_completed({i: ['cache_get', ['missing', i]] for i in range(0, 20)}))
+    except ThinClientException as e:
+        recent_exception = e
+    elapsed = time() - start
+    slow_mock.stop()
+    assert recent_exception is not None and elapsed < 0.5, 'Operations cancelled after failure (%s)' % elapsed
+
+
+def test_pool_shed():
+    slow_mock = MockServer(caches=['atomic'], delay=0.2).start()
+    pool = ThinClientPool(1, slow_mock.address, queue_size=2, shed=True)
+    running = pool.submit('cache_put', 'atomic', 1, 'value 1')
+    sleep(0.1)
+    batch = [pool.submit('cache_get', 'atomic', 1, priority=1) for idx in range(0, 2)]
+    online = pool.submit('cache_get', 'atomic', 1)
+    rejected = pool.submit('cache_get', 'atomic', 1, priority=1)
+    pool.close()
+    pool = ThinClientPool(1, slow_mock.address)
+    pool.submit('cache_get', 'atomic', 1)
+    order = []
+    batch_thread = Thread(target=lambda: order.extend(oper_id for oper_id, result in pool.as_completed(
+        {'batch': ['cache_get', ['atomic', 1]]}, priority=1
+    )))
+    batch_thread.start()
+    sleep(0.1)
+    pool.submit('cache_get', 'atomic', 1).add_done_callback(lambda future: order.append('online'))
+    batch_thread.join()
+    pool.close()
+    slow_mock.stop()
+    assert order == ['online', 'batch'], 'Batch of lower priority executed later (%s)' % order
+    assert running.result(), 'Running operation completed'
+    assert online.result() == 'value 1', 'Online operation completed (%s)' % online.exception()
+    assert batch[0].result() == 'value 1', 'First batch operation completed (%s)' % batch[0].exception()
+    assert isinstance(batch[1].exception(), ThinClientPoolOverloadException), 'Latest batch operation shed'
+    assert isinstance(rejected.exception(), ThinClientPoolOverloadException), 'Operation of low priority rejected'
+
+
+def test_adaptive_limiter():
+    limiter = AIMDLimiter(8, initial_limit=4)
+    for idx in range(0, 100):
+        limiter.update(0.001, limiter.limit)
+    assert limiter.limit == 8, 'Limit increased up to maximum (%s)' % limiter.limit
+    for idx in range(0, 100):
+        limiter.update(0.1, limiter.limit)
+    assert limiter.limit < 8, 'Limit decreased on latency growth (%s)' % limiter.limit
+    for idx in range(0, 1000):
+        limiter.update(0.001, limiter.limit, dropped=True)
+    assert limiter.limit == 1, 'Limit decreased to minimum on errors (%s)' % limiter.limit
+    pool = ThinClientPool(4, mock.address, adaptive=True)
+    results = dict(pool.as_completed({i: ['cache_put', ['atomic', i, 'value %s' % i]] for i in range(0, 100)}))
+    pool.close()
+    assert len(results) == 100, 'All operations completed with adaptive limit (%s)' % len(results)
+
+
+def test_affinity_partition():
+    # Partitions of RendezvousAffinityFunction with 1024 and 1000 partitions
+    expected = {1: (1, 1), -1: (0, 0), 12345: (57, 345), 'key': (606, 79), 3000000000: (208, 296)}
+    for key, partitions in expected.items():
+        binary_key = BinaryObject().load_value(key).serialize()
+        assert (affinity_partition(binary_key, 1024), affinity_partition(binary_key, 1000)) == partitions, \
+            'Partition of key %s is %s' % (key, partitions)
+
+
+def test_sync_cache():
+    thin.cache_clear('atomic')
+    entries = {i: 'value %s' % i for i in range(0, 1000)}
+    fd, manifest = mkstemp()
+    os_fd_close(fd)
+    remove(manifest)
+    stats = thin.sync_cache('atomic', entries, partitions=16, manifest=manifest)
+    assert stats['puts'] == 1000 and stats['removes'] == 0, 'All entries stored (%s)' % stats
+    assert thin.scan_query('atomic') == entries, 'Cache is synced'
+    entries[5] = 'value 5 new'
+    del entries[7]
+    stats = thin.sync_cache('atomic', entries, partitions=16, manifest=manifest)
+    assert stats == {'partitions': 2, 'puts': 1, 'removes': 1}, 'Only changed entries synced (%s)' % stats
+    thin.cache_put('atomic', 1000, 'not synced')
+    stats = thin.sync_cache('atomic', entries, partitions=16, manifest=manifest)
+    assert stats['partitions'] == 0, 'No partitions changed since the last sync (%s)' % stats
+    stats = thin.sync_cache('atomic', entries, partitions=16, manifest=manifest, verify=True)
+    assert stats == {'partitions': 1, 'puts': 0, 'removes': 1}, 'Changes of cache found (%s)' % stats
+    remove(manifest)
+    assert thin.scan_query('atomic') == entries, 'Cache is synced'
+    for partitions in [8, 32]:
+        recent_exception = ''
+        try:
+            thin.sync_cache('atomic', {}, partitions=partitions)
+        except ThinClientException as e:
+            recent_exception = str(e)
+        assert 'partitions' in recent_exception, 'Wrong number of partitions error (%s)' % recent_exception
+    assert thin.scan_query('atomic') == entries, 'Cache is not changed by sync with wrong partitions'
+
+
+def test_cache_configuration():
+    configuration = CacheConfiguration('configured', atomicity_mode='ATOMIC', backups=1,
+                                       write_synchronization_mode='PRIMARY_SYNC', rebalance_batch_size=1024 * 1024,
+                                       key_configurations=[('org.apache.ignite.tests.Key', 'affinityId')])
+    thin.cache_create_with_configuration(configuration)
+    thin.cache_get_or_create_with_configuration(CacheConfiguration('configured', backups=2))
+    received = thin.cache_get_configuration('configured')
+    thin.cache_destroy('configured')
+    assert received.name == 'configured', 'Cache name received (%s)' % received
+    assert received.backups == 1, 'Existing cache is not changed (%s)' % received.backups
+    assert received.rebalance_batch_size == 1024 * 1024, 'Rebalance batch size (%s)' % received
+    assert received.cache_mode == 'PARTITIONED', 'Default cache mode (%s)' % received.cache_mode
+    assert received.key_configurations == [('org.apache.ignite.tests.Key', 'affinityId')], 'Key configurations'
+
+
+def test_large_objects():
+    thin.cache_clear('atomic')
+    value = urandom(5 * 1024 * 1024 + 100)
+    store = thin.large_objects('atomic', chunk_size=64 * 1024)
+    store.put('blob', value)
+    assert store.get('blob') == value, 'Value read back'
+    pool = ThinClientPool(4, mock.address)
+    pool_store = LargeObjectStore(pool, 'atomic', chunk_size=100 * 1024, batch_chunks=2)
+    new_value = urandom(1024 * 1024)
+    pool_store.put('blob', new_value)
+    buffer = bytearray(len(new_value))
+    assert pool_store.get('blob', buffer) is buffer and buffer == new_value, 'New value read to the buffer'
+    pool.close()
+    assert thin.cache_get_size('atomic') == 12, 'Chunks of the old value removed (%s)' % thin.cache_get_size('atomic')
+    assert store.remove('blob'), 'Value removed'
+    assert store.get('blob') is None and thin.cache_get_size('atomic') == 0, 'No value and chunks'
+    thin.cache_put('atomic', 'plain', 'value')
+    recent_exception = ''
+    try:
+        store.get('plain')
+    except LargeObjectException as e:
+        recent_exception = str(e)
+    assert 'not a large object' in recent_exception, 'Not a large object error (%s)' % recent_exception
+
+
+def test_copy_cache():
+    thin.cache_clear('atomic')
+    entries = {i: 'value %s' % i for i in range(0, 1000)}
+    thin.cache_put_all('atomic', entries)
+    thin.cache_create_with_name('atomic_copy')
+    stats = thin.copy_cache('atomic', 'atomic_copy', workers=4, partitions=16, cursor_page_size=50)
+    assert stats == {'partitions': 16, 'entries': 1000}, 'All partitions copied (%s)' % stats
+    assert thin.scan_query('atomic_copy') == entries, 'Entries copied without changes'
+    thin.cache_clear('atomic_copy')
+    fd, progress = mkstemp()
+    os_fd_close(fd)
+    with open(progress, 'w') as progress_file:
+        for partition in [0, 1]:
+            progress_file.write('%s %s\n' % (partition, len(thin.scan_query('atomic', partition=partition))))
+    stats = thin.copy_cache('atomic', 'atomic_copy', lambda key, value: (key, value.upper()) if key % 2 == 0 else None,
+                            partitions=16, progress=progress)
+    with open(progress) as progress_file:
+        done = sorted(int(line.split()[0]) for line in progress_file)
+    remove(progress)
+    copied = thin.scan_query('atomic_copy')
+    thin.cache_destroy('atomic_copy')
+    assert stats['partitions'] == 14, 'Copied partitions are skipped (%s)' % stats
+    assert done == list(range(0, 16)), 'All partitions are in progress file (%s)' % done
+    assert len(copied) == stats['entries'] and all(key % 2 == 0 for key in copied), 'Entries filtered'
+    assert all(value == 'VALUE %s' % key for key, value in copied.items()), 'Entries transformed'
+    thin.cache_create_with_name('atomic_copy')
+    recent_exception = ''
+    try:
+        thin.copy_cache('atomic', 'atomic_copy', partitions=8)
+    except ThinClientException as e:
+        recent_exception = str(e)
+    thin.cache_destroy('atomic_copy')
+    assert 'more partitions' in recent_exception, 'Partitions not copied error (%s)' % recent_exception
+
+
+def test_throttled_scan():
+    thin.cache_clear('atomic')
+    entries = {i: 'value %s' % i for i in range(0, 600)}
+    thin.cache_put_all('atomic', entries)
+    start = time()
+    pages = list(thin.throttled_scan('atomic', partitions=16, entries_per_second=300, cursor_page_size=5,
+                                     target_page_latency=1, probe_key=0))
+    elapsed = time() - start
+    scanned = {}
+    for page in pages:
+        scanned.update(page)
+    assert scanned == entries, 'All entries scanned'
+    assert elapsed > 0.9, 'Scan is limited to 300 entries per second after the burst (%s)' % elapsed
+    assert len(pages) < 600 // 5, 'Page size is increased (%s pages)' % len(pages)
+    latencies = [0.0001, 0.05, 0.05, 0.0001]
+    throttle = ScanThrottle(probe=lambda: sleep(latencies.pop(0)), probe_interval=0, pause=0.01)
+    throttle.check_probe()
+    throttle.check_probe()
+    assert throttle.paused > 0 and len(latencies) == 0, 'Scan paused while probe latency is degraded'
+    latencies = [0.0001] + [0.01] * 100
+    throttle = ScanThrottle(probe=lambda: sleep(latencies.pop(0)), probe_interval=0, pause=0.01, max_wait=0.05)
+    throttle.check_probe()
+    throttle.check_probe()
+    assert 0 < throttle.paused <= 0.05, 'Pause is limited by max wait (%s)' % throttle.paused
+    paused = throttle.paused
+    throttle.check_probe()
+    assert throttle.paused == paused, 'Baseline follows the recent latencies after a fast outlier'
+    recent_exception = ''
+    try:
+        list(thin.throttled_scan('atomic', partitions=8))
+    except ThinClientException as e:
+        recent_exception = str(e)
+    assert 'more partitions' in recent_exception, 'Partitions not scanned error (%s)' % recent_exception
+
+
+def test_fork():
+    thin.cache_put('atomic', 'pid', 'parent')
+    pool = ThinClientPool(2, mock.address, fork_prewarm=True)
+    assert pool.submit('cache_get', 'atomic', 'pid').result() == 'parent', 'Pool connected in parent'
+    read_fd, write_fd = pipe()
+    pid = fork()
+    if pid == 0:
+        status = 1
+        try:
+            thin.cache_put('atomic', 'child', 'child value')
+            if thin.cache_get('atomic', 'pid') == 'parent' and \
+                    pool.submit('cache_get', 'atomic', 'child').result() == 'child value':
+                status = 0
+        finally:
+            write(write_fd, bytes([status]))
+            _exit(status)
+    os_fd_close(write_fd)
+    child_status = read(read_fd, 1)
+    os_fd_close(read_fd)
+    waitpid(pid, 0)
+    assert child_status == b'\x00', 'Child process reconnected the inherited client and pool'
+    assert thin.cache_get('atomic', 'child') == 'child value', 'Parent connection is not broken by child'
+    assert pool.submit('cache_get', 'atomic', 'pid').result() == 'parent', 'Parent pool is not broken by child'
+    pool.close()
+
+
+def test_hot_keys():
+    tracker = HotKeyTracker(sample_rate=1, top=5)
+    client = ThinClient(hot_keys=tracker)
+    client.connect(mock.address)
+    client.cache_put_all('atomic', {i: 'value %s' % i for i in range(0, 100)})
+    for i in range(0, 100):
+        client.cache_get('atomic', 7)
+        client.cache_get('atomic', i)
+    client.cache_put('atomic', 7, 'x' * 1000)
+    client.disconnect()
+    hot_keys = tracker.hot_keys('atomic', 3)
+    assert hot_keys[0]['key'] == 7, 'Key 7 is the hottest one (%s)' % hot_keys
+    assert hot_keys[0]['count'] >= 102, 'Key 7 accesses estimated (%s)' % hot_keys[0]
+    assert hot_keys[0]['write_rate'] > 0 and hot_keys[0]['read_rate'] > hot_keys[0]['write_rate'], \
+        'Key 7 is mostly read (%s)' % hot_keys[0]
+    assert len(hot_keys) == 3 and len(tracker.caches['atomic'].keys) <= 5, 'Top keys are bounded (%s)' % hot_keys
+    assert tracker.hot_keys('other') == [], 'No hot keys of not accessed cache'
+    typed_tracker = HotKeyTracker(sample_rate=1, top=5)
+    typed_tracker.record('atomic', [1, True, True, 1.0, 1.0, 1.0], 'reads', 60)
+    hot_keys = typed_tracker.hot_keys('atomic')
+    counts = [(type(hot_key['key']), hot_key['count']) for hot_key in hot_keys]
+    assert counts == [(float, 3), (bool, 2), (int, 1)], 'Keys of different types are tracked apart (%s)' % counts
+
+
+def test_collapse():
+    slow_mock = MockServer(caches=['atomic'], delay=0.2).start()
+    pool = ThinClientPool(4, slow_mock.address, collapse=True)
+    pool.submit('cache_put_all', 'atomic', {1: 'value 1', 2: 'value 2'}).result()
+    start = time()
+    gets = [pool.submit('cache_get', 'atomic', 1) for idx in range(0, 20)]
+    get_alls = [pool.submit('cache_get_all', 'atomic', [1, 2]) for idx in range(0, 20)]
+    values = [future.result() for future in gets]
+    entries = [future.result() for future in get_alls]
+    elapsed = time() - start
+    collapsed = pool.single_flight.collapsed
+    pool.close()
+    assert values == ['value 1'] * 20, 'Value shared by collapsed gets (%s)' % values
+    assert entries == [{1: 'value 1', 2: 'value 2'}] * 20 and entries[0] is not entries[1], \
+        'Copies of entries shared by collapsed get_all (%s)' % entries
+    assert collapsed == 38 and elapsed < 0.6, 'One request of each kind sent (%s, %s s)' % (collapsed, elapsed)
+    assert SingleFlight.key('cache_get', 'atomic', [1, 2]) != SingleFlight.key('cache_get', 'atomic', [2, 1]), \
+        'List keys are ordered'
+    assert SingleFlight.key('cache_get', 'atomic', [1, 1]) != SingleFlight.key('cache_get', 'atomic', [1]), \
+        'List keys keep duplicates'
+    assert SingleFlight.key('cache_get', 'atomic', (1,)) != SingleFlight.key('cache_get', 'atomic', (True,)), \
+        'List keys keep item types'
+    assert SingleFlight.key('get_all', key_set=[1, 2, 1]) == SingleFlight.key('get_all', key_set=[2, 1]), \
+        'Key set is not ordered'
+    single_flight = SingleFlight()
+    results = {}
+
+    def get(idx, timeout):
+        client = ThinClient(collapse=single_flight)
+        client.connect(slow_mock.address)
+        try:
+            results[idx] = client.cache_get('atomic', 1, timeout=timeout)
+        except ThinClientTimeoutException:
+            results[idx] = 'timeout'
+        client.disconnect()
+
+    threads = [Thread(target=get, args=(idx, 1)) for idx in range(0, 4)]
+    for thread in threads:
+        thread.start()
+    sleep(0.05)
+    impatient = Thread(target=get, args=(4, 0.05))
+    impatient.start()
+    for thread in threads + [impatient]:
+        thread.join()
+    slow_mock.stop()
+    assert results == {0: 'value 1', 1: 'value 1', 2: 'value 1', 3: 'value 1', 4: 'timeout'}, \
+        'Callers wait with their own timeouts (%s)' % results
+    assert single_flight.collapsed == 4, 'Threads share one request (%s)' % single_flight.collapsed
+
+
+def test_key_filter():
+    thin.cache_clear('atomic')
+    thin.cache_put_all('atomic', {i: 'value %s' % i for i in range(0, 1000)})
+    client = ThinClient()
+    client.connect(mock.address)
+    client.build_key_filter('atomic', false_positive_rate=0.01, rebuild_interval=0.2)
+    request_id = client.request_id
+    found = [key for key in range(1000, 3000) if client.cache_contains_key('atomic', key)]
+    requests = client.request_id - request_id
+    assert found == [] and requests < 100, 'Misses answered locally (%s requests)' % requests
+    assert all(client.cache_contains_key('atomic', key) for key in range(0, 1000)), 'No false negatives'
+    assert client.cache_get_all('atomic', [1, 2, 5000]) == {1: 'value 1', 2: 'value 2'}, 'Present keys received'
+    client.cache_put('atomic', 5000, 'value 5000')
+    assert client.cache_get('atomic', 5000) == 'value 5000', 'Written key added to filter'
+    thin.cache_put('atomic', 6000, 'value 6000')
+    assert client.cache_get('atomic', 6000) is None, 'Key written by another client unknown until rebuild'
+    sleep(0.3)
+    client.cache_contains_key('atomic', 0)
+    deadline = time() + 5
+    while client.cache_get('atomic', 6000) is None and time() < deadline:
+        sleep(0.05)
+    assert client.cache_get('atomic', 6000) == 'value 6000', 'Key written by another client found after rebuild'
+    client.key_filters.add('atomic', None)
+    request_id = client.request_id
+    client.cache_contains_key('atomic', 7000)
+    assert client.request_id == request_id + 1, 'Filter dropped after write of unknown keys'
+    client.drop_key_filter('atomic')
+    client.disconnect()
+
+
+def test_put_all_arrays():
+    thin.cache_clear('atomic')
+    keys = array('q', range(0, 1000))
+    values = array('d', [key / 2 for key in range(0, 1000)])
+    request_id = thin.request_id
+    count = thin.cache_put_all_arrays('atomic', keys, values, page_bytes=18 * 300)
+    assert count == 1000 and thin.request_id - request_id == 4, 'Entries put by pages of 300 (%s)' % count
+    entries = thin.scan_query('atomic')
+    assert entries == {key: key / 2 for key in range(0, 1000)}, 'Keys and values interleaved'
+    thin.cache_put_all_arrays('atomic', array('i', [-1, 2**31 - 1]), array('h', [-5, 7]))
+    assert thin.cache_get('atomic', -1, key_type='int') == -5, 'Int key and short value put'
+    assert thin.cache_get('atomic', 2**31 - 1, key_type='int') == 7, 'Max int key put'
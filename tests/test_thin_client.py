@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 
-from ignite import ThinClient, ThinClientException
+from array import array
+from ignite import BinaryException, CacheConfiguration, ThinClient, ThinClientException, ThinClientPool
+from tempfile import mkstemp
 from time import time
+import os
 
 thin = ThinClient()
 
@@ -125,6 +128,19 @@ def test_create_destroy_cache():
         assert 'Cache does not exist' in recent_exception, "Cache '%s' does not exists" % cache
 
 
+def test_create_cache_with_configuration():
+    cache = 'my_configured_cache_%s' % time()
+    configuration = CacheConfiguration(cache, atomicity_mode='ATOMIC', backups=1,
+                                       write_synchronization_mode='PRIMARY_SYNC')
+    thin.cache_get_or_create_with_configuration(configuration)
+    thin.cache_get_or_create_with_configuration(configuration)
+    received = thin.cache_get_configuration(cache)
+    thin.cache_destroy(cache)
+    assert received.name == cache, "Configuration of cache '%s' received (%s)" % (cache, received)
+    assert received.backups == 1, 'Number of backups is 1 (%s)' % received.backups
+    assert received.write_synchronization_mode == 'PRIMARY_SYNC', 'Write synchronization mode is PRIMARY_SYNC'
+
+
 def test_scan_query():
     thin.cache_clear('atomic')
     send_entries = []
@@ -136,3 +152,208 @@ def test_scan_query():
     for key in sorted(entries.keys()):
         rcvd_entries.append("%s: %s" % (key, entries[key]))
     assert send_entries == rcvd_entries, "Received entries %s " % entries
+
+
+def test_scan_query_keys():
+    thin.cache_clear('atomic')
+    thin.cache_put_all('atomic', {i: {'id': i, 'name': 'item %s' % i} for i in range(1, 101)})
+    keys = thin.scan_query_keys('atomic', cursor_page_size=30)
+    assert sorted(keys) == list(range(1, 101)), 'All keys scanned (%s)' % keys
+
+
+def test_put_if_absent():
+    thin.cache_clear('atomic')
+    stored = thin.cache_put_if_absent('atomic', 13, 'value 13')
+    assert stored, "Entry for key 13 stored"
+    stored = thin.cache_put_if_absent('atomic', 13, 'value 13 new')
+    assert not stored, "Entry for key 13 not overwritten"
+    value = thin.cache_get('atomic', 13)
+    assert value == 'value 13', "Received value is 'value 13' (%s)" % value
+
+
+def test_get_and_put():
+    thin.cache_clear('atomic')
+    old_value = thin.cache_get_and_put('atomic', 14, 'value 14')
+    assert old_value is None, "No previous value for key 14 (%s)" % old_value
+    old_value = thin.cache_get_and_put('atomic', 14, 'value 14 new')
+    assert old_value == 'value 14', "Previous value is 'value 14' (%s)" % old_value
+    value = thin.cache_get('atomic', 14)
+    assert value == 'value 14 new', "Received value is 'value 14 new' (%s)" % value
+
+
+def test_get_and_replace():
+    thin.cache_clear('atomic')
+    old_value = thin.cache_get_and_replace('atomic', 15, 'value 15')
+    assert old_value is None, "No previous value for key 15 (%s)" % old_value
+    assert not thin.cache_contains_key('atomic', 15), "Entry for key 15 not created by replace"
+    thin.cache_put('atomic', 15, 'value 15')
+    old_value = thin.cache_get_and_replace('atomic', 15, 'value 15 new')
+    assert old_value == 'value 15', "Previous value is 'value 15' (%s)" % old_value
+
+
+def test_get_and_remove():
+    thin.cache_clear('atomic')
+    thin.cache_put('atomic', 16, 'value 16')
+    old_value = thin.cache_get_and_remove('atomic', 16)
+    assert old_value == 'value 16', "Removed value is 'value 16' (%s)" % old_value
+    size = thin.cache_get_size('atomic')
+    assert size == 0, 'Cache size is 0 after get and remove (%s)' % size
+
+
+def test_get_and_put_if_absent():
+    thin.cache_clear('atomic')
+    old_value = thin.cache_get_and_put_if_absent('atomic', 17, 'value 17')
+    assert old_value is None, "No previous value for key 17 (%s)" % old_value
+    old_value = thin.cache_get_and_put_if_absent('atomic', 17, 'value 17 new')
+    assert old_value == 'value 17', "Existing value is 'value 17' (%s)" % old_value
+    value = thin.cache_get('atomic', 17)
+    assert value == 'value 17', "Received value is 'value 17' (%s)" % value
+
+
+def test_replace():
+    thin.cache_clear('atomic')
+    replaced = thin.cache_replace('atomic', 18, 'value 18')
+    assert not replaced, "Missing entry for key 18 not replaced"
+    thin.cache_put('atomic', 18, 'value 18')
+    replaced = thin.cache_replace('atomic', 18, 'value 18 new')
+    assert replaced, "Entry for key 18 replaced"
+    value = thin.cache_get('atomic', 18)
+    assert value == 'value 18 new', "Received value is 'value 18 new' (%s)" % value
+
+
+def test_replace_if_equals():
+    thin.cache_clear('atomic')
+    thin.cache_put('atomic', 19, 'value 19')
+    replaced = thin.cache_replace_if_equals('atomic', 19, 'wrong value', 'value 19 new')
+    assert not replaced, "Entry for key 19 not replaced for wrong old value"
+    replaced = thin.cache_replace_if_equals('atomic', 19, 'value 19', 'value 19 new')
+    assert replaced, "Entry for key 19 replaced"
+    value = thin.cache_get('atomic', 19)
+    assert value == 'value 19 new', "Received value is 'value 19 new' (%s)" % value
+
+
+def test_remove_if_equals():
+    thin.cache_clear('atomic')
+    thin.cache_put('atomic', 20, 'value 20')
+    removed = thin.cache_remove_if_equals('atomic', 20, 'wrong value')
+    assert not removed, "Entry for key 20 not removed for wrong value"
+    removed = thin.cache_remove_if_equals('atomic', 20, 'value 20')
+    assert removed, "Entry for key 20 removed"
+    size = thin.cache_get_size('atomic')
+    assert size == 0, 'Cache size is 0 after remove if equals (%s)' % size
+
+
+def test_clear_keys():
+    thin.cache_clear('atomic')
+    send_entries = {}
+    for i in range(21, 31):
+        send_entries[i] = 'value %s' % i
+    thin.cache_put_all('atomic', send_entries)
+    thin.cache_clear_keys('atomic', list(range(21, 29)), chunk_size=3)
+    size = thin.cache_get_size('atomic')
+    assert size == 2, 'Cache size is 2 after clear keys (%s)' % size
+
+
+def test_remove_keys():
+    thin.cache_clear('atomic')
+    send_entries = {}
+    for i in range(31, 41):
+        send_entries[i] = 'value %s' % i
+    thin.cache_put_all('atomic', send_entries)
+    thin.cache_remove_keys('atomic', list(range(31, 39)), chunk_size=3)
+    size = thin.cache_get_size('atomic')
+    assert size == 2, 'Cache size is 2 after remove keys (%s)' % size
+    assert thin.cache_contains_keys('atomic', [39, 40]), 'Entries for keys 39,40 found'
+
+
+def test_failover_nodes():
+    failover_thin = ThinClient(nodes=[('127.0.0.1', 10799), ('127.0.0.1', 10800)], standby=1)
+    failover_thin.connect()
+    assert failover_thin.node == ('127.0.0.1', 10800), 'Unreachable node skipped (%s)' % str(failover_thin.node)
+    failover_thin.cache_put('atomic', 41, 'value 41')
+    failover_thin.sock.close()
+    value = failover_thin.cache_get('atomic', 41)
+    failover_thin.disconnect()
+    assert value == 'value 41', "Received value after reconnect is 'value 41' (%s)" % value
+
+
+def test_zero_copy():
+    zero_copy_thin = ThinClient(zero_copy=True)
+    zero_copy_thin.connect()
+    zero_copy_thin.cache_clear('atomic')
+    zero_copy_thin.cache_put('atomic', 42, b'\x00\x01\x02' * 1000)
+    value = zero_copy_thin.cache_get('atomic', 42)
+    assert isinstance(value, memoryview), 'Byte array is returned as memoryview (%s)' % type(value).__name__
+    assert value == b'\x00\x01\x02' * 1000, 'Received byte array is the same as sent'
+    zero_copy_thin.cache_put('atomic', 43, value)
+    assert thin.cache_get('atomic', 43) == value.tobytes(), 'Memoryview is stored as byte array'
+    zero_copy_thin.cache_put('atomic', b'k1', 'bytes key')
+    entries = zero_copy_thin.cache_get_all('atomic', [b'k1'])
+    assert entries == {b'k1': 'bytes key'}, 'Byte array keys are hashable (%s)' % entries
+    assert zero_copy_thin.scan_query('atomic')[b'k1'] == 'bytes key', 'Byte array keys are scanned'
+    zero_copy_thin.disconnect()
+
+
+def test_typed_cache():
+    thin.cache_clear('atomic')
+    typed = thin.typed_cache('atomic', key='int', value='string')
+    typed.put(44, 'value 44')
+    value = typed.get(44)
+    assert value == 'value 44', "Received value is 'value 44' (%s)" % value
+    assert not thin.cache_contains_key('atomic', 44), 'Typed key int differs from python int (long)'
+    assert thin.cache_contains_key('atomic', 44, key_type='int'), 'Typed key is stored as int'
+    typed.put_all({45: 'value 45', 46: 'value 46'})
+    values = typed.get_all([44, 45, 46])
+    assert values == {44: 'value 44', 45: 'value 45', 46: 'value 46'}, 'Received values %s' % values
+    recent_exception = ''
+    try:
+        typed.put('key 47', 'value 47')
+    except BinaryException as e:
+        recent_exception = str(e)
+    assert 'is not of type int' in recent_exception, 'Wrong key type rejected (%s)' % recent_exception
+    bytes_typed = thin.typed_cache('atomic', key='int', value='python.bytes')
+    bytes_typed.put(48, memoryview(array('q', [1, 2])))
+    value = bytes_typed.get(48)
+    assert value == array('q', [1, 2]).tobytes(), 'All bytes of typed buffer stored (%s)' % value
+
+
+def test_scan_query_columns():
+    thin.cache_clear('atomic')
+    for i in range(1, 101):
+        thin.cache_put('atomic', i, {'id': i, 'price': i * 1.5, 'name': 'item %s' % i})
+    columns = thin.scan_query_columns('atomic', columns=['_key', 'price'], output='array', cursor_page_size=30)
+    assert sorted(columns.keys()) == ['_key', 'price'], 'Only requested columns returned (%s)' % list(columns.keys())
+    prices = dict(zip(columns['_key'], columns['price']))
+    assert len(prices) == 100, 'All entries scanned (%s)' % len(prices)
+    assert prices[10] == 15.0, 'Price for key 10 is 15.0 (%s)' % prices[10]
+
+
+def test_pool_submit():
+    thin.cache_clear('atomic')
+    pool = ThinClientPool(4)
+    futures = [pool.submit('cache_put', 'atomic', i, 'value %s' % i) for i in range(50, 60)]
+    assert all(future.result() for future in futures), 'All entries stored'
+    results = dict(pool.as_completed({i: ['cache_get', ['atomic', i]] for i in range(50, 60)}))
+    pool.close()
+    assert len(results) == 10, 'All results received (%s)' % len(results)
+    assert results[55]['result'] == 'value 55', "Received value is 'value 55' (%s)" % results[55]['result']
+
+
+def test_export_import_cache():
+    thin.cache_clear('atomic')
+    send_entries = {}
+    for i in range(60, 160):
+        send_entries[i] = 'value %s' % i
+    thin.cache_put_all('atomic', send_entries)
+    fd, path = mkstemp()
+    os.close(fd)
+    try:
+        exported = thin.export_cache('atomic', path, cursor_page_size=30)
+        assert exported == 100, 'Exported 100 entries (%s)' % exported
+        thin.cache_clear('atomic')
+        imported = thin.import_cache(path, 'atomic')
+        assert imported == 100, 'Imported 100 entries (%s)' % imported
+    finally:
+        os.remove(path)
+    rcvd_entries = thin.scan_query('atomic')
+    assert rcvd_entries == send_entries, 'Imported entries are the same as exported'